@@ -0,0 +1,445 @@
+# Description: This script contains a fake Spotify Web API serving a synthetic library, mounted as a requests transport adapter or served over local HTTP.
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+API_URL = "https://api.spotify.com/v1/"
+
+
+class LibrarySize(NamedTuple):
+    saved_tracks: int
+    playlists: int
+    playlist_tracks: int
+    saved_albums: int
+    saved_shows: int
+    saved_episodes: int
+    played_tracks: int
+
+
+SIZES = {
+    "1k": LibrarySize(1_000, 50, 100, 100, 20, 200, 50),
+    "10k": LibrarySize(10_000, 200, 200, 500, 50, 1_000, 200),
+    "100k": LibrarySize(100_000, 500, 500, 2_000, 100, 5_000, 500),
+}
+
+
+def timestamp(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class FakeLibrary:
+    """
+    A synthetic Spotify library with catalog objects shaped like the API responses.
+
+    The library is generated from a seed, so every run of a benchmark sees the
+    same data. Tracks share albums and artists, as in a real library.
+    """
+
+    def __init__(self, size: LibrarySize, seed: int = 0):
+        rng = random.Random(seed)
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+
+        self.artists = [
+            {
+                "id": f"artist{i:07d}",
+                "name": f"Artist {i}",
+                "type": "artist",
+                "external_urls": {"spotify": f"https://open.spotify.com/artist/{i}"},
+            }
+            for i in range(max(1, size.saved_tracks // 10))
+        ]
+        self.albums = [
+            {
+                "id": f"album{i:07d}",
+                "name": f"Album {i}",
+                "album_type": "album",
+                "type": "album",
+                "label": f"Label {i % 100}",
+                "popularity": rng.randint(0, 100),
+                "release_date": f"{rng.randint(1960, 2024)}-01-01",
+                "total_tracks": 0,
+                "external_urls": {"spotify": f"https://open.spotify.com/album/{i}"},
+                "artists": [rng.choice(self.artists)],
+            }
+            for i in range(max(1, size.saved_tracks // 5))
+        ]
+        self.tracks = []
+        self.album_tracks = {album["id"]: [] for album in self.albums}
+        for i in range(size.saved_tracks):
+            album = self.albums[i % len(self.albums)]
+            album["total_tracks"] += 1
+            track = {
+                "id": f"track{i:07d}",
+                "name": f"Track {i}",
+                "type": "track",
+                "duration_ms": rng.randint(60_000, 600_000),
+                "explicit": rng.random() < 0.1,
+                "is_local": False,
+                "popularity": rng.randint(0, 100),
+                "track_number": album["total_tracks"],
+                "external_urls": {"spotify": f"https://open.spotify.com/track/{i}"},
+                "album": album,
+                "artists": album["artists"] + rng.sample(self.artists, k=1),
+            }
+            self.tracks.append(track)
+            self.album_tracks[album["id"]].append(
+                {k: v for k, v in track.items() if k not in ("album", "popularity")}
+            )
+
+        # Tracks embed a simplified album, without the label and popularity
+        simplified_albums = {
+            album["id"]: {
+                k: v for k, v in album.items() if k not in ("label", "popularity")
+            }
+            for album in self.albums
+        }
+        for track in self.tracks:
+            track["album"] = simplified_albums[track["album"]["id"]]
+
+        self.saved_tracks = [
+            {"added_at": timestamp(now - timedelta(minutes=i)), "track": track}
+            for i, track in enumerate(self.tracks)
+        ]
+        self.saved_albums = [
+            {"added_at": timestamp(now - timedelta(minutes=i)), "album": album}
+            for i, album in enumerate(self.albums[: size.saved_albums])
+        ]
+        self.shows = [
+            {
+                "id": f"show{i:07d}",
+                "name": f"Show {i}",
+                "type": "show",
+                "description": f"Description of show {i}",
+                "explicit": False,
+                "is_externally_hosted": False,
+                "languages": ["en"],
+                "media_type": "audio",
+                "publisher": f"Publisher {i % 10}",
+                "total_episodes": rng.randint(1, 500),
+                "external_urls": {"spotify": f"https://open.spotify.com/show/{i}"},
+            }
+            for i in range(max(1, size.saved_shows))
+        ]
+        self.saved_shows = [
+            {"added_at": timestamp(now - timedelta(minutes=i)), "show": show}
+            for i, show in enumerate(self.shows)
+        ]
+        self.saved_episodes = [
+            {
+                "added_at": timestamp(now - timedelta(minutes=i)),
+                "episode": {
+                    "id": f"episode{i:07d}",
+                    "name": f"Episode {i}",
+                    "type": "episode",
+                    "description": f"Description of episode {i}",
+                    "duration_ms": rng.randint(600_000, 7_200_000),
+                    "explicit": False,
+                    "is_externally_hosted": False,
+                    "is_playable": True,
+                    "language": "en",
+                    "release_date": "2024-01-01",
+                    "external_urls": {
+                        "spotify": f"https://open.spotify.com/episode/{i}"
+                    },
+                    "show": self.shows[i % len(self.shows)],
+                },
+            }
+            for i in range(size.saved_episodes)
+        ]
+        self.playlists = []
+        self.playlist_items = {}
+        for i in range(size.playlists):
+            playlist_id = f"playlist{i:07d}"
+            self.playlist_items[playlist_id] = [
+                {
+                    "added_at": timestamp(now - timedelta(days=j)),
+                    "added_by": {"id": "bench-user"},
+                    "track": track,
+                }
+                for j, track in enumerate(
+                    rng.sample(
+                        self.tracks, k=min(size.playlist_tracks, len(self.tracks))
+                    )
+                )
+            ]
+            self.playlists.append(
+                {
+                    "id": playlist_id,
+                    "name": f"Playlist {i}",
+                    "type": "playlist",
+                    "public": True,
+                    "snapshot_id": f"snapshot{i}",
+                    "external_urls": {
+                        "spotify": f"https://open.spotify.com/playlist/{i}"
+                    },
+                    "owner": {
+                        "id": "bench-user",
+                        "display_name": "Bench User",
+                        "type": "user",
+                        "external_urls": {
+                            "spotify": "https://open.spotify.com/user/bench-user"
+                        },
+                    },
+                    "tracks": {"total": len(self.playlist_items[playlist_id])},
+                }
+            )
+        # Plays of the last day, oldest first, as recently played pages forward
+        self.played_tracks = sorted(
+            (
+                {
+                    "played_at": timestamp(
+                        now - timedelta(seconds=rng.randint(60, 23 * 3600))
+                    ),
+                    "track": rng.choice(self.tracks),
+                }
+                for _ in range(size.played_tracks)
+            ),
+            key=lambda item: item["played_at"],
+        )
+
+
+class FakeSpotifyAdapter(BaseAdapter):
+    """
+    A requests transport adapter answering Spotify Web API requests from a FakeLibrary.
+
+    Every request waits for the given latency, and throttle_rate of the requests are
+    answered with a 429 and a Retry-After header, like the real API does under load.
+    """
+
+    def __init__(
+        self,
+        library: FakeLibrary,
+        latency: float = 0.02,
+        throttle_rate: float = 0.0,
+        retry_after: int = 0,
+        seed: int = 0,
+    ):
+        super().__init__()
+        self.library = library
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.calls = 0
+        self.throttled = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._routes = {
+            "me/tracks": lambda q: self._page(library.saved_tracks, q, "me/tracks"),
+            "me/albums": lambda q: self._page(
+                library.saved_albums, q, "me/albums", full=True
+            ),
+            "me/shows": lambda q: self._page(library.saved_shows, q, "me/shows"),
+            "me/episodes": lambda q: self._page(
+                library.saved_episodes, q, "me/episodes"
+            ),
+            "me/top/tracks": lambda q: self._page(library.tracks, q, "me/top/tracks"),
+            "me/player/recently-played": self._recently_played,
+            "me": lambda q: {"id": "bench-user"},
+            "users/bench-user/playlists": lambda q: self._page(
+                library.playlists, q, "users/bench-user/playlists"
+            ),
+            "albums": self._albums,
+            "audio-features": self._audio_features,
+            "artists": self._artists,
+            "recommendations/available-genre-seeds": lambda q: {
+                "genres": ["acoustic", "jazz", "rock"]
+            },
+        }
+        self._albums_by_id = {album["id"]: album for album in library.albums}
+        self._artists_by_id = {artist["id"]: artist for artist in library.artists}
+
+    def _page(self, items: list, query: dict, path: str = "", full: bool = False):
+        limit = int(query.get("limit", 20))
+        offset = int(query.get("offset", 0))
+        page = items[offset : offset + limit]
+        if full:
+            # Saved albums embed the first page of their tracks, as the API does
+            page = [
+                {**item, "album": self._full_album(item["album"])} for item in page
+            ]
+        has_next = offset + limit < len(items)
+        return {
+            "href": f"{API_URL}{path}",
+            "items": page,
+            "limit": limit,
+            "offset": offset,
+            "total": len(items),
+            "next": (
+                f"{API_URL}{path}?limit={limit}&offset={offset + limit}"
+                if has_next
+                else None
+            ),
+            "previous": None,
+        }
+
+    def _full_album(self, album: dict) -> dict:
+        tracks = self.library.album_tracks[album["id"]]
+        return {
+            **album,
+            "tracks": self._page(
+                tracks, {"limit": 50}, path=f"albums/{album['id']}/tracks"
+            ),
+        }
+
+    def _albums(self, query: dict) -> dict:
+        return {
+            "albums": [
+                self._full_album(self._albums_by_id[album_id])
+                for album_id in query["ids"].split(",")
+            ]
+        }
+
+    def _artists(self, query: dict) -> dict:
+        artists = []
+        for artist_id in query["ids"].split(","):
+            rng = random.Random(artist_id)
+            artists.append(
+                {
+                    **self._artists_by_id[artist_id],
+                    "genres": rng.sample(
+                        ["acoustic", "jazz", "rock"], rng.randrange(3)
+                    ),
+                    "popularity": rng.randrange(101),
+                    "followers": {"href": None, "total": rng.randrange(10**6)},
+                }
+            )
+        return {"artists": artists}
+
+    def _audio_features(self, query: dict) -> dict:
+        features = []
+        for track_id in query["ids"].split(","):
+            rng = random.Random(track_id)
+            features.append(
+                {
+                    "id": track_id,
+                    "type": "audio_features",
+                    "danceability": rng.random(),
+                    "energy": rng.random(),
+                    "key": rng.randrange(12),
+                    "loudness": -60 * rng.random(),
+                    "mode": rng.randrange(2),
+                    "speechiness": rng.random(),
+                    "acousticness": rng.random(),
+                    "instrumentalness": rng.random(),
+                    "liveness": rng.random(),
+                    "valence": rng.random(),
+                    "tempo": rng.uniform(60, 200),
+                    "duration_ms": rng.randrange(60_000, 600_000),
+                    "time_signature": rng.choice([3, 4, 5]),
+                }
+            )
+        return {"audio_features": features}
+
+    def _recently_played(self, query: dict) -> dict:
+        after = timestamp(
+            datetime.fromtimestamp(int(query.get("after", 0)) / 1000, timezone.utc)
+        )
+        items = [
+            item for item in self.library.played_tracks if item["played_at"] > after
+        ][: int(query.get("limit", 20))]
+        cursor = (
+            int(datetime.fromisoformat(items[-1]["played_at"]).timestamp() * 1000)
+            if items
+            else None
+        )
+        return {
+            "items": items,
+            "cursors": {"after": str(cursor)} if cursor else None,
+            "limit": len(items),
+        }
+
+    def _route(self, path: str, query: dict) -> dict | None:
+        if path in self._routes:
+            return self._routes[path](query)
+        parts = path.split("/")
+        if len(parts) == 3 and parts[0] == "albums" and parts[2] == "tracks":
+            return self._page(self.library.album_tracks[parts[1]], query, path)
+        # Newer spotipy versions request playlists/{id}/items
+        if (
+            len(parts) == 3
+            and parts[0] == "playlists"
+            and parts[2] in ("tracks", "items")
+        ):
+            return self._page(self.library.playlist_items[parts[1]], query, path)
+        return None
+
+    def _response(self, request, status: int, body: dict, headers: dict = None):
+        response = requests.Response()
+        response.status_code = status
+        response.reason = requests.status_codes._codes[status][0].upper()
+        response.url = request.url
+        response.request = request
+        response.headers.update({"Content-Type": "application/json", **(headers or {})})
+        response._content = json.dumps(body).encode()
+        return response
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.calls += 1
+            throttled = self._rng.random() < self.throttle_rate
+            if throttled:
+                self.throttled += 1
+
+        time.sleep(self.latency)
+        if throttled:
+            return self._response(
+                request,
+                429,
+                {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                {"Retry-After": str(self.retry_after)},
+            )
+
+        url = urlsplit(request.url)
+        path = url.path.removeprefix(urlsplit(API_URL).path).strip("/")
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = self._route(path, query)
+        if body is None:
+            return self._response(
+                request, 404, {"error": {"status": 404, "message": "Not found"}}
+            )
+        return self._response(request, 200, body)
+
+    def close(self):
+        pass
+
+
+def serve(adapter: FakeSpotifyAdapter) -> ThreadingHTTPServer:
+    """
+    Serves the fake API over HTTP on a free local port, for clients not built on requests.
+
+    Args:
+        adapter (FakeSpotifyAdapter): The adapter answering the requests.
+
+    Returns:
+        ThreadingHTTPServer: The running server, the API is at http://127.0.0.1:<port>/v1/.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            request = requests.Request(
+                "GET", urlsplit(API_URL)._replace(path="").geturl() + self.path
+            ).prepare()
+            response = adapter.send(request)
+            self.send_response(response.status_code)
+            for name, value in response.headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(response.content)))
+            self.end_headers()
+            self.wfile.write(response.content)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
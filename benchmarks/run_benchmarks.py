@@ -0,0 +1,184 @@
+# Description: This script runs the extraction jobs end to end against a fake Spotify API and the local SQLite sink.
+import argparse
+import contextlib
+import importlib
+import json
+import logging
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+
+import requests
+
+from fake_spotify import API_URL, SIZES, FakeLibrary, FakeSpotifyAdapter, serve
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+
+# The extraction module run by each benchmark, every module has a main(sp) entry point
+JOBS = {
+    "saved_tracks": "current_user_saved_tracks",
+    "saved_albums": "current_user_saved_albums",
+    "saved_episodes": "current_user_saved_episodes",
+    "saved_shows": "current_user_saved_shows",
+    "top_tracks": "current_user_top_tracks",
+    "played_tracks": "my_played_tracks",
+    "playlists": "my_playlists",
+    "genres": "recommendation_genre_seeds",
+}
+
+
+def get_rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def count_rows(path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with contextlib.closing(sqlite3.connect(path)) as connection:
+        tables = connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).fetchall()
+        return sum(
+            connection.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+            for (name,) in tables
+        )
+
+
+def run_job(job: str, size: str, latency: float, throttle_rate: float) -> dict:
+    """
+    Runs one extraction job against a fresh fake library and a fresh local sink.
+
+    This runs in its own process, so the peak RSS belongs to this job only.
+
+    Args:
+        job (str): The name of the benchmark, a key of JOBS.
+        size (str): The library size, a key of SIZES.
+        latency (float): The latency of every fake API call in seconds.
+        throttle_rate (float): The fraction of API calls answered with a 429.
+
+    Returns:
+        dict: The measurements of the run.
+    """
+    workdir = tempfile.mkdtemp(prefix=f"bench-{job}-")
+    sink_path = os.path.join(workdir, "bench.sqlite")
+    os.environ.update(
+        {
+            "SINK": "sqlite",
+            "SINK_PATH": sink_path,
+            "STATE_DIR": os.path.join(workdir, "state"),
+            "AUDIO_FEATURES_CACHE_PATH": os.path.join(workdir, "audio_features.sqlite"),
+            "ARTISTS_CACHE_PATH": os.path.join(workdir, "artists.sqlite"),
+        }
+    )
+    sys.path.insert(0, SCRIPTS_DIR)
+    logging.basicConfig(level=logging.WARNING)
+
+    from artists import load_artists
+    from audio_features import load_audio_features
+    from dimensions import load_dimensions
+    from metrics import get_metrics
+    from rate_limit import RateLimitedSpotify, get_limiter
+
+    library = FakeLibrary(SIZES[size])
+    adapter = FakeSpotifyAdapter(library, latency=latency, throttle_rate=throttle_rate)
+    session = requests.Session()
+    session.mount(API_URL, adapter)
+    sp = RateLimitedSpotify(auth="fake-token", requests_session=session)
+    # The asyncio client does not use requests, it gets the fake API over local HTTP
+    server = serve(adapter)
+    os.environ["SPOTIFY_API_URL"] = f"http://127.0.0.1:{server.server_port}/v1/"
+    module = importlib.import_module(JOBS[job])
+
+    baseline_rss = get_rss_mb()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        module.main(sp)
+        load_audio_features(sp)
+        load_artists(sp)
+        load_dimensions()
+    seconds = time.perf_counter() - start
+    server.shutdown()
+    rows = count_rows(sink_path)
+
+    return {
+        "job": job,
+        "size": size,
+        "seconds": round(seconds, 3),
+        "api_calls": adapter.calls,
+        "throttled": adapter.throttled,
+        "final_rate": round(get_limiter().rate, 2),
+        "rows": rows,
+        "rows_per_second": round(rows / seconds, 1) if seconds else None,
+        "baseline_rss_mb": round(baseline_rss, 1),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "metrics": get_metrics().report(),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the extraction jobs against a fake Spotify API."
+    )
+    parser.add_argument("jobs", nargs="*", help="The jobs to run, all by default.")
+    parser.add_argument("--size", choices=SIZES, default="1k")
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Seconds per fake API call."
+    )
+    parser.add_argument(
+        "--throttle-rate",
+        type=float,
+        default=0.01,
+        help="Fraction of API calls answered with a 429.",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        default="100",
+        help="Initial requests per second of the rate limiter (SPOTIFY_RATE_LIMIT).",
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+    unknown = set(args.jobs) - set(JOBS)
+    if unknown:
+        parser.error(f"Unknown jobs {unknown}, choose from {list(JOBS)}")
+
+    os.environ["SPOTIFY_RATE_LIMIT"] = args.rate_limit
+    os.environ.setdefault("SPOTIFY_MAX_RATE_LIMIT", str(10 * float(args.rate_limit)))
+
+    results = []
+    print(
+        f"{'job':<16}{'size':>6}{'seconds':>10}{'calls':>8}{'429s':>6}"
+        f"{'rows':>9}{'rows/s':>11}{'peak MB':>10}"
+    )
+    # Every job runs in a new process, so imports, caches and peak RSS are not shared
+    context = get_context("spawn")
+    for job in args.jobs or JOBS:
+        with context.Pool(1) as pool:
+            result = pool.apply(
+                run_job, (job, args.size, args.latency, args.throttle_rate)
+            )
+        results.append(result)
+        print(
+            f"{result['job']:<16}{result['size']:>6}{result['seconds']:>10.2f}"
+            f"{result['api_calls']:>8}{result['throttled']:>6}{result['rows']:>9}"
+            f"{result['rows_per_second']:>11.0f}{result['peak_rss_mb']:>10.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# Description: This script enriches the credited artists of every extracted track with their genres, popularity and followers.
+import logging
+import os
+import spotipy
+from dimensions import get_extracted_tracks, is_collecting_artists
+from enrichment import ObjectStore, fetch_batches
+from mapping import compile_table
+from metrics import get_metrics
+from sinks import get_sink
+from validations import check_if_valid_data
+
+# The maximum number of IDs of the artists endpoint
+BATCH_SIZE = 50
+
+
+def get_artist_store() -> ObjectStore:
+    # Genres rarely change but popularity and followers do, so artists expire
+    ttl = float(os.environ.get("ARTIST_TTL_DAYS", "7")) * 24 * 3600
+    return ObjectStore(
+        os.environ.get("ARTISTS_CACHE_PATH", "cache/artists.sqlite"), ttl=ttl
+    )
+
+
+def fetch_artists(sp: spotipy.Spotify, artist_ids: list[str]) -> dict[str, dict | None]:
+    """
+    Fetches the given artists in concurrent batches.
+
+    Args:
+        sp (spotipy.Spotify): The Spotify client.
+        artist_ids (list[str]): The IDs of the artists.
+
+    Returns:
+        dict[str, dict | None]: The artists by ID, None for unknown artists.
+    """
+    artists = fetch_batches(
+        lambda batch: sp.artists(batch)["artists"], artist_ids, BATCH_SIZE
+    )
+    get_metrics().inc("artists_fetched", len(artist_ids))
+    return artists
+
+
+def load_track_artists(credits: dict[str, list[str]]):
+    rows = [
+        (track_id, artist_id, position)
+        for track_id, artist_ids in credits.items()
+        for position, artist_id in enumerate(artist_ids)
+    ]
+    data = compile_table("track_artists")(
+        rows,
+        track_id=[row[0] for row in rows],
+        artist_id=[row[1] for row in rows],
+        artist_position=[row[2] for row in rows],
+    )
+    if check_if_valid_data(data, "track_id", "artist_position"):
+        get_sink().replace_rows(
+            data, "track_artists", key="track_id", keys=list(credits)
+        )
+
+
+def load_artists(sp: spotipy.Spotify):
+    """
+    Loads the credited artists of the tracks extracted in this run if ARTIST_ENRICHMENT is enabled.
+
+    Every credit is loaded into track_artists. Only artists missing from the artist
+    store or older than ARTIST_TTL_DAYS are requested, and their rows in artists and
+    artist_genres are replaced. The store is updated after the load, so artists of a
+    failed load are requested again by the next run.
+
+    Args:
+        sp (spotipy.Spotify): The Spotify client.
+    """
+    if not is_collecting_artists():
+        return
+
+    credits, artist_ids = get_extracted_tracks().pop_credits()
+    if credits:
+        load_track_artists(credits)
+
+    with get_artist_store() as store:
+        stale = store.stale(artist_ids)
+        logging.info(
+            "%d of %d extracted artists are unknown or stale",
+            len(stale),
+            len(artist_ids),
+        )
+        if not stale:
+            return
+
+        try:
+            artists = fetch_artists(sp, stale)
+        except:
+            logging.exception("Something went wrong while fetching the artists")
+            raise
+
+        items = [artist for artist in artists.values() if artist]
+        data = compile_table("artists")(items)
+        if check_if_valid_data(data, "artist_id"):
+            fetched = data["artist_id"].tolist()
+            get_sink().replace_rows(data, "artists", key="artist_id", keys=fetched)
+
+            pairs = [
+                (artist["id"], genre)
+                for artist in items
+                for genre in artist.get("genres") or []
+            ]
+            genres = compile_table("artist_genres")(
+                pairs,
+                artist_id=[pair[0] for pair in pairs],
+                genre=[pair[1] for pair in pairs],
+            )
+            # Also run without genres, to remove the genres an artist no longer has
+            get_sink().replace_rows(
+                genres, "artist_genres", key="artist_id", keys=fetched
+            )
+        store.put(artists)
@@ -0,0 +1,216 @@
+# Description: This script contains an asyncio client for the Spotify API endpoints used by the extraction scripts.
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+import aiohttp
+import spotipy
+
+from metrics import endpoint_label, get_metrics
+from rate_limit import RETRY_STATUSES, TokenBucket, get_limiter
+
+
+class AsyncSpotify:
+    """
+    An asyncio Spotify API client with a keep-alive connection pool.
+
+    The OAuth token is taken from an authenticated spotipy client, so both clients
+    share one token cache and one rate limiter. Use it as an async context manager.
+    """
+
+    def __init__(
+        self,
+        sp: spotipy.Spotify,
+        max_in_flight: int = 16,
+        base_url: str | None = None,
+        limiter: TokenBucket | None = None,
+        max_retries: int = 5,
+        backoff_factor: float = 0.5,
+    ):
+        self.sp = sp
+        self.max_in_flight = max_in_flight
+        self.base_url = base_url or os.environ.get(
+            "SPOTIFY_API_URL", "https://api.spotify.com/v1/"
+        )
+        self.limiter = limiter or get_limiter()
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.max_in_flight, keepalive_timeout=30
+            ),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def get(self, url: str, **params) -> dict:
+        """
+        Sends a GET request, retrying throttled and failed requests with backoff.
+
+        Throttled and failed requests, connection errors and timeouts are retried with
+        jittered exponential backoff, waiting at least as long as Retry-After asks for.
+
+        Args:
+            url (str): An endpoint path relative to base_url, or an absolute URL such as a page's next URL.
+            **params: Query parameters, parameters with None values are dropped.
+
+        Returns:
+            dict: The JSON response.
+        """
+        if not url.startswith("http"):
+            url = self.base_url + url
+        params = {k: str(v) for k, v in params.items() if v is not None}
+        metrics = get_metrics()
+        endpoint = endpoint_label(url.removeprefix(self.base_url))
+
+        for attempt in range(self.max_retries + 1):
+            # Refreshing the token may block, so it runs outside of the event loop
+            headers = await asyncio.to_thread(self.sp._auth_headers)
+            await asyncio.sleep(self.limiter.reserve())
+
+            try:
+                async with self._semaphore:
+                    start = time.perf_counter()
+                    async with self._session.get(
+                        url, params=params, headers=headers
+                    ) as response:
+                        body = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                metrics.inc("api_calls", endpoint=endpoint, status="connection_error")
+                if attempt == self.max_retries:
+                    raise
+                metrics.inc("retries", endpoint=endpoint)
+                logging.warning(
+                    "Request to %s failed with %r, retry %d of %d",
+                    url,
+                    e,
+                    attempt + 1,
+                    self.max_retries,
+                )
+                await asyncio.sleep(random.uniform(0, self.backoff_factor * 2**attempt))
+                continue
+
+            metrics.observe("api_call", time.perf_counter() - start, endpoint=endpoint)
+            metrics.inc("api_response_bytes", len(body))
+            if response.status < 400:
+                metrics.inc("api_calls", endpoint=endpoint, status="ok")
+                self.limiter.on_success()
+                return json.loads(body)
+
+            metrics.inc("api_calls", endpoint=endpoint, status=response.status)
+            if response.status not in RETRY_STATUSES or attempt == self.max_retries:
+                raise spotipy.SpotifyException(
+                    response.status,
+                    -1,
+                    f"{url}: {body.decode(errors='replace')}",
+                    headers=dict(response.headers),
+                )
+            metrics.inc("retries", endpoint=endpoint)
+
+            retry_after = response.headers.get("Retry-After")
+            retry_after = float(retry_after) if retry_after else None
+            delay = random.uniform(0, self.backoff_factor * 2**attempt)
+            if response.status == 429:
+                self.limiter.on_throttled(retry_after)
+            elif retry_after is not None:
+                delay = max(delay, retry_after)
+
+            logging.warning(
+                "Request to %s failed with status %d, retry %d of %d",
+                url,
+                response.status,
+                attempt + 1,
+                self.max_retries,
+            )
+            await asyncio.sleep(delay)
+
+    async def fetch_all_pages(self, url: str, limit: int = 50, **params) -> list[dict]:
+        """
+        Fetches every item of an offset-based paging endpoint.
+
+        The first page is requested on its own to learn the total, then all remaining
+        pages are requested at once, bounded by the in-flight limit.
+
+        Args:
+            url (str): The endpoint path, e.g. "me/tracks".
+            limit (int): The number of items to request per page.
+            **params: Extra query parameters.
+
+        Returns:
+            list[dict]: All items, in the order the API returned them.
+        """
+        first_page = await self.get(url, limit=limit, offset=0, **params)
+        pages = await asyncio.gather(
+            *[
+                self.get(url, limit=limit, offset=offset, **params)
+                for offset in range(
+                    first_page.get("limit", limit), first_page["total"], limit
+                )
+            ]
+        )
+
+        items = list(first_page["items"])
+        for page in pages:
+            items.extend(page["items"])
+        return items
+
+    async def current_user_saved_tracks(self) -> list[dict]:
+        return await self.fetch_all_pages("me/tracks")
+
+    async def current_user_saved_albums(self) -> list[dict]:
+        return await self.fetch_all_pages("me/albums")
+
+    async def current_user_saved_episodes(self) -> list[dict]:
+        return await self.fetch_all_pages("me/episodes")
+
+    async def current_user_saved_shows(self) -> list[dict]:
+        return await self.fetch_all_pages("me/shows")
+
+    async def albums(self, album_ids: list[str]) -> list[dict]:
+        response = await self.get("albums", ids=",".join(album_ids))
+        return response["albums"]
+
+    async def album_tracks(self, album_id: str) -> list[dict]:
+        return await self.fetch_all_pages(f"albums/{album_id}/tracks")
+
+    async def playlist_items(self, playlist_id: str) -> list[dict]:
+        return await self.fetch_all_pages(
+            f"playlists/{playlist_id}/tracks", limit=100, additional_types="track"
+        )
+
+
+def fetch_playlists_items(
+    sp: spotipy.Spotify, playlist_id_list: list, max_in_flight: int = 16
+) -> list[list[dict]]:
+    """
+    Fetches the items of all given playlists at once on an event loop.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify client to take the OAuth token from.
+        playlist_id_list (list): The IDs of the playlists.
+        max_in_flight (int): The maximum number of requests sent at the same time.
+
+    Returns:
+        list[list[dict]]: The items of each playlist, in the order of playlist_id_list.
+    """
+
+    async def fetch() -> list[list[dict]]:
+        async with AsyncSpotify(sp, max_in_flight=max_in_flight) as client:
+            return await asyncio.gather(
+                *[
+                    client.playlist_items(playlist_id)
+                    for playlist_id in playlist_id_list
+                ]
+            )
+
+    return asyncio.run(fetch())
@@ -0,0 +1,86 @@
+# Description: This script enriches every extracted track with its audio features, fetching each track only once.
+import logging
+import os
+import spotipy
+from dimensions import get_extracted_tracks, is_collecting_track_ids
+from enrichment import ObjectStore, fetch_batches
+from mapping import compile_table
+from metrics import get_metrics
+from sinks import get_sink
+from validations import check_if_valid_data
+
+# The maximum number of IDs of the audio-features endpoint
+BATCH_SIZE = 100
+
+
+def get_feature_store() -> ObjectStore:
+    # Audio features never change, so they are kept forever
+    return ObjectStore(
+        os.environ.get("AUDIO_FEATURES_CACHE_PATH", "cache/audio_features.sqlite")
+    )
+
+
+def fetch_audio_features(
+    sp: spotipy.Spotify, track_ids: list[str]
+) -> dict[str, dict | None]:
+    """
+    Fetches the audio features of the given tracks in concurrent batches.
+
+    Args:
+        sp (spotipy.Spotify): The Spotify client.
+        track_ids (list[str]): The IDs of the tracks.
+
+    Returns:
+        dict[str, dict | None]: The features by track ID, None for tracks without features.
+    """
+    features = fetch_batches(
+        lambda batch: sp.audio_features(batch) or [None] * len(batch),
+        track_ids,
+        BATCH_SIZE,
+    )
+    get_metrics().inc("audio_features_fetched", len(track_ids))
+    return features
+
+
+def load_audio_features(sp: spotipy.Spotify):
+    """
+    Loads the audio features of the tracks extracted in this run if AUDIO_FEATURES is enabled.
+
+    Only tracks missing from the feature store are requested and loaded, the rows of
+    earlier runs are already in the track_audio_features table. The store is updated
+    after the load, so features of a failed load are requested again by the next run.
+
+    Args:
+        sp (spotipy.Spotify): The Spotify client.
+    """
+    if not is_collecting_track_ids():
+        return
+
+    track_ids = get_extracted_tracks().track_ids()
+    with get_feature_store() as store:
+        missing = store.stale(track_ids)
+        logging.info(
+            "%d of %d extracted tracks have no stored audio features",
+            len(missing),
+            len(track_ids),
+        )
+        if not missing:
+            return
+
+        try:
+            features = fetch_audio_features(sp, missing)
+        except:
+            logging.exception("Something went wrong while fetching the audio features")
+            raise
+
+        items = [item for item in features.values() if item]
+        data = compile_table("track_audio_features")(items)
+        if check_if_valid_data(data, "track_id"):
+            # Replacing the rows of the fetched tracks keeps a rerun after a failed store update idempotent
+            get_sink().replace_rows(
+                data,
+                "track_audio_features",
+                key="track_id",
+                keys=data["track_id"].tolist(),
+            )
+        store.put(features)
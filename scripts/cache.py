@@ -0,0 +1,194 @@
+# Description: This script contains an on-disk cache for Spotify API responses of rarely changing catalog endpoints.
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import spotipy
+
+from metrics import get_metrics
+
+# Time to live in seconds of the cached responses, by endpoint path. Endpoints without a rule are never cached.
+TTL_RULES = [
+    (re.compile(r"^albums/"), 7 * 24 * 3600),
+    (re.compile(r"^shows/"), 24 * 3600),
+    (re.compile(r"^artists"), 24 * 3600),
+    (re.compile(r"^recommendations/available-genre-seeds"), 7 * 24 * 3600),
+]
+
+
+class ResponseCache:
+    """
+    A SQLite backed cache of JSON responses with least recently used eviction.
+
+    Expired entries are kept while they have an ETag, so they can be revalidated
+    with If-None-Match instead of downloading the response again.
+    """
+
+    def __init__(
+        self, path: str, max_entries: int = 50_000, max_bytes: int = 200 * 2**20
+    ):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                etag TEXT,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+
+    def get(self, key: str) -> tuple[dict | None, str | None, bool]:
+        """
+        Looks up a cached response.
+
+        Args:
+            key (str): The cache key of the request.
+
+        Returns:
+            tuple[dict | None, str | None, bool]: The cached body, its ETag and whether it is still fresh.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, etag, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None, None, False
+
+            self._connection.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._connection.commit()
+            return json.loads(row[0]), row[1], row[2] > time.time()
+
+    def record(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+        get_metrics().inc("cache_requests", result=stat)
+
+    def put(self, key: str, body: dict, etag: str | None, ttl: int):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(body), etag, now + ttl, now),
+            )
+            self._evict()
+            self._connection.commit()
+
+    def refresh(self, key: str, ttl: int):
+        with self._lock:
+            self._connection.execute(
+                "UPDATE responses SET expires_at = ? WHERE key = ?",
+                (time.time() + ttl, key),
+            )
+            self._connection.commit()
+
+    def _evict(self):
+        # Expired entries that cannot be revalidated are useless
+        self._connection.execute(
+            "DELETE FROM responses WHERE etag IS NULL AND expires_at < ?",
+            (time.time(),),
+        )
+        entries, size = self._connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM responses"
+        ).fetchone()
+
+        while entries > self.max_entries or size > self.max_bytes:
+            oldest = self._connection.execute(
+                "SELECT key, LENGTH(body) FROM responses ORDER BY last_access LIMIT 100"
+            ).fetchall()
+            for key, length in oldest:
+                if entries <= self.max_entries and size <= self.max_bytes:
+                    break
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                entries -= 1
+                size -= length
+                self.stats["evicted"] += 1
+                get_metrics().inc("cache_evicted")
+
+    def log_stats(self):
+        logging.info(
+            "Response cache: %d hits, %d misses, %d revalidated, %d evicted",
+            self.stats["hits"],
+            self.stats["misses"],
+            self.stats["revalidated"],
+            self.stats["evicted"],
+        )
+
+
+class CachedSpotify(spotipy.Spotify):
+    """
+    A Spotify client answering GET requests to catalog endpoints from a ResponseCache.
+    """
+
+    def __init__(self, *args, cache: ResponseCache, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = cache
+        self._request_state = threading.local()
+        self._session.hooks["response"].append(self._remember_response)
+
+    def _remember_response(self, response, *args, **kwargs):
+        self._request_state.response = response
+
+    def _auth_headers(self):
+        headers = super()._auth_headers()
+        etag = getattr(self._request_state, "etag", None)
+        if etag:
+            headers["If-None-Match"] = etag
+        return headers
+
+    def _get_ttl(self, url: str) -> int | None:
+        path = url.removeprefix(self.prefix)
+        for pattern, ttl in TTL_RULES:
+            if pattern.match(path):
+                return ttl
+        return None
+
+    def _internal_call(self, method, url, payload, params):
+        ttl = self._get_ttl(url) if method == "GET" else None
+        if ttl is None:
+            return super()._internal_call(method, url, payload, params)
+
+        key = json.dumps(
+            [
+                url.removeprefix(self.prefix),
+                sorted((k, v) for k, v in params.items() if v is not None),
+            ]
+        )
+        body, etag, fresh = self.cache.get(key)
+        if fresh:
+            self.cache.record("hits")
+            return body
+
+        self._request_state.etag = etag
+        self._request_state.response = None
+        try:
+            results = super()._internal_call(method, url, payload, params)
+        finally:
+            self._request_state.etag = None
+
+        response = self._request_state.response
+        if response is not None and response.status_code == 304:
+            self.cache.record("revalidated")
+            self.cache.refresh(key, ttl)
+            return body
+
+        self.cache.record("misses")
+        if results is not None:
+            etag = response.headers.get("ETag") if response is not None else None
+            self.cache.put(key, results, etag, ttl)
+        return results
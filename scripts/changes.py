@@ -0,0 +1,174 @@
+# Description: This script loads full table snapshots as the rows inserted, updated and deleted since the last load.
+import logging
+import os
+import numpy as np
+import pandas as pd
+from dtypes import STRING_DTYPE
+from load2bq import apply_schema
+from metrics import get_metrics
+from schemas import SCHEMAS
+from sinks import get_sink
+from state import get_state_dir
+
+
+def is_enabled() -> bool:
+    return os.environ.get("CHANGE_CAPTURE", "false").lower() == "true"
+
+
+def row_hashes(data: pd.DataFrame, table_id: str, keys: list[str]) -> pd.DataFrame:
+    """
+    Computes a content hash of every row of a table.
+
+    String columns are cast to one dtype first, so the hash of a row does not depend
+    on whether a column was stored as a category in one run and not in the next.
+
+    Args:
+        data (pd.DataFrame): The table.
+        table_id (str): The name of the table, its schema gives the hashed columns.
+        keys (list[str]): The primary key columns.
+
+    Returns:
+        pd.DataFrame: The key columns as strings and the row_hash of every row.
+    """
+    data = apply_schema(data, table_id)
+    data = data.astype(
+        {
+            column.name: STRING_DTYPE
+            for column in SCHEMAS[table_id]
+            if column.type == "STRING"
+        }
+    )
+    hashes = data[keys].astype(str)
+    hashes["row_hash"] = pd.util.hash_pandas_object(data, index=False).to_numpy()
+    return hashes.reset_index(drop=True)
+
+
+class HashIndex:
+    """
+    The row hashes of a table as of its last successful load, kept on disk with the
+    state of the sink and destination, so loads into another database or dataset
+    start from scratch.
+    """
+
+    def __init__(self, table_id: str):
+        self.table_id = table_id
+        self.path = os.path.join(get_state_dir(), "row_hashes", f"{table_id}.parquet")
+
+    def load(self) -> pd.DataFrame | None:
+        if not os.path.exists(self.path):
+            logging.info("No row hashes found for %s", self.table_id)
+            return None
+        return pd.read_parquet(self.path)
+
+    def save(self, hashes: pd.DataFrame):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        hashes.to_parquet(f"{self.path}.tmp", index=False)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            logging.info("Dropping the row hashes of %s", self.table_id)
+            os.remove(self.path)
+
+
+def diff(
+    current: pd.DataFrame, previous: pd.DataFrame, keys: list[str]
+) -> tuple[np.ndarray, np.ndarray, pd.DataFrame]:
+    """
+    Compares the row hashes of a table with the hashes of its last load.
+
+    Args:
+        current (pd.DataFrame): The row hashes of the extracted table.
+        previous (pd.DataFrame): The row hashes of the last load.
+        keys (list[str]): The primary key columns.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, pd.DataFrame]: Masks of the inserted and of the
+        updated rows of the current table, and the keys of the deleted rows.
+    """
+    # Nullable hashes, as float hashes of unmatched rows would lose precision
+    merged = (
+        current.astype({"row_hash": "UInt64"})
+        .assign(row=np.arange(len(current)))
+        .merge(
+            previous.astype({"row_hash": "UInt64"}),
+            on=keys,
+            how="outer",
+            suffixes=("", "_previous"),
+            indicator=True,
+        )
+    )
+
+    inserted = np.zeros(len(current), dtype=bool)
+    updated = np.zeros(len(current), dtype=bool)
+    new = merged[merged["_merge"] == "left_only"]
+    inserted[new["row"].astype(int)] = True
+    both = merged[merged["_merge"] == "both"]
+    changed = both[both["row_hash"] != both["row_hash_previous"]]
+    updated[changed["row"].astype(int)] = True
+
+    deleted = merged.loc[merged["_merge"] == "right_only", keys]
+    return inserted, updated, deleted.reset_index(drop=True)
+
+
+def load_changes(
+    data: pd.DataFrame,
+    table_id: str,
+    keys: list[str],
+    load_type: str = "WRITE_TRUNCATE",
+):
+    """
+    Loads a table, shipping only the changed rows if CHANGE_CAPTURE is enabled.
+
+    A full snapshot is compared with the row hashes of the last load, and only the
+    inserted, updated and deleted rows are merged into the sink. Without row hashes
+    the snapshot is loaded as a whole. Appended rows are added to the row hashes.
+    The row hashes are saved after the load, so a failed load is retried as a whole.
+    Loads with CHANGE_CAPTURE disabled drop the row hashes, as they no longer match
+    the table, so the next load with it enabled is a full load again.
+
+    Args:
+        data (pd.DataFrame): The extracted table.
+        table_id (str): The table to load.
+        keys (list[str]): The primary key columns, as passed to check_if_valid_data.
+        load_type (str): WRITE_TRUNCATE for a full snapshot, WRITE_APPEND for new rows.
+    """
+    if not is_enabled():
+        get_sink().load(data, table_id, load_type)
+        HashIndex(table_id).clear()
+        return
+
+    index = HashIndex(table_id)
+    current = row_hashes(data, table_id, keys)
+    previous = index.load()
+
+    if load_type == "WRITE_APPEND" or previous is None:
+        get_sink().load(data, table_id, load_type)
+        if load_type == "WRITE_TRUNCATE":
+            index.save(current)
+        elif previous is not None:
+            index.save(
+                pd.concat([previous, current], ignore_index=True).drop_duplicates(
+                    keys, keep="last"
+                )
+            )
+        return
+
+    inserted, updated, deleted = diff(current, previous, keys)
+    logging.info(
+        "Captured %d inserts, %d updates and %d deletes of %d rows for %s",
+        inserted.sum(),
+        updated.sum(),
+        len(deleted),
+        len(data),
+        table_id,
+    )
+    metrics = get_metrics()
+    metrics.inc("rows_changed", int(inserted.sum()), table=table_id, change="insert")
+    metrics.inc("rows_changed", int(updated.sum()), table=table_id, change="update")
+    metrics.inc("rows_changed", len(deleted), table=table_id, change="delete")
+
+    changed = inserted | updated
+    if changed.any() or not deleted.empty:
+        get_sink().merge(data[changed], table_id, keys, deleted)
+    index.save(current)
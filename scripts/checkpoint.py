@@ -0,0 +1,78 @@
+# Description: This script contains the staging area where fetched pages are kept until their load succeeded.
+import json
+import logging
+import os
+import shutil
+
+
+def get_staging_dir() -> str:
+    return os.environ.get("STAGING_DIR", "staging")
+
+
+class PageCheckpoint:
+    """
+    The fetched pages of one paging request, staged on disk by offset.
+
+    A run that fails halfway leaves its pages behind, so the next run only fetches
+    the missing pages. The pages are cleared once the table they belong to is loaded.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.directory = os.path.join(get_staging_dir(), name)
+
+    def load(self) -> dict[int, dict]:
+        """
+        Loads the staged pages.
+
+        Returns:
+            dict[int, dict]: The staged pages by offset, empty if nothing was staged.
+        """
+        if not os.path.isdir(self.directory):
+            return {}
+
+        pages = {}
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(".json"):
+                continue
+            with open(os.path.join(self.directory, file_name), encoding="utf-8") as f:
+                pages[int(file_name.removesuffix(".json"))] = json.load(f)
+        return pages
+
+    def save(self, offset: int, page: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{offset:08d}.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(page, f)
+        os.replace(f"{path}.tmp", path)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def get_checkpoint(name: str) -> PageCheckpoint | None:
+    """
+    Returns the checkpoint of the given paging request if CHECKPOINT_PAGES is enabled.
+
+    Args:
+        name (str): The name of the request, e.g. "saved_tracks" or "my_playlists_tracks/<id>".
+
+    Returns:
+        PageCheckpoint | None: The checkpoint, or None if checkpointing is disabled.
+    """
+    if os.environ.get("CHECKPOINT_PAGES", "false").lower() != "true":
+        return None
+    return PageCheckpoint(name)
+
+
+def commit(name: str):
+    """
+    Clears the staged pages of a table after its load succeeded.
+
+    Args:
+        name (str): The name of the checkpoint, or of a parent of several checkpoints.
+    """
+    if os.environ.get("CHECKPOINT_PAGES", "false").lower() != "true":
+        return
+    PageCheckpoint(name).clear()
+    logging.info("Cleared the staged pages of %s", name)
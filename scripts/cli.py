@@ -0,0 +1,87 @@
+# Description: This script is the command line entry point to run the extraction jobs.
+import time
+
+# Measured before anything else is imported, to report the cold start time of the CLI
+START = time.perf_counter()
+
+import argparse
+import logging
+import os
+import sys
+
+from job import init_job
+
+
+def run(args: argparse.Namespace) -> int:
+    from artists import load_artists
+    from audio_features import load_audio_features
+    from connect_to_spotify import SCOPES, connect2spotify
+    from dimensions import load_dimensions
+    from pipeline import report, run_pipeline, select_tasks
+
+    tasks = select_tasks(args.tasks)
+    imported = time.perf_counter()
+    sp = connect2spotify(SCOPES)
+    connected = time.perf_counter()
+
+    cold_start = (
+        f"Cold start {connected - START:.2f}s "
+        f"(imports {imported - START:.2f}s, auth {connected - imported:.2f}s)"
+    )
+    logging.info(cold_start)
+    print(cold_start)
+
+    logging.info(
+        "The pipeline started with tasks %s and %d workers.",
+        [task.name for task in tasks],
+        args.workers,
+    )
+    statuses = run_pipeline(sp, tasks, args.workers)
+    report(statuses)
+    load_audio_features(sp)
+    load_artists(sp)
+    # Dimension rows are shared by the tasks, so they are loaded once at the end
+    load_dimensions()
+    if hasattr(sp, "cache"):
+        sp.cache.log_stats()
+    logging.info("The pipeline finished in %.1fs", time.perf_counter() - START)
+
+    return int(any(status.status == "failed" for status in statuses.values()))
+
+
+def list_tasks(args: argparse.Namespace) -> int:
+    from pipeline import TASKS
+
+    for task in TASKS:
+        dependencies = ", ".join(task.depends_on)
+        print(f"{task.name:<22} {dependencies}")
+    return 0
+
+
+def main() -> int:
+    init_job("pipeline")
+
+    parser = argparse.ArgumentParser(description="Run the Spotify extraction jobs.")
+    subparsers = parser.add_subparsers(required=True)
+
+    run_parser = subparsers.add_parser(
+        "run", help="Run the given tasks and their dependencies, or all tasks."
+    )
+    run_parser.add_argument("tasks", nargs="*", help="The names of the tasks to run.")
+    run_parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("PIPELINE_WORKERS", "4")),
+        help="The maximum number of tasks running at the same time.",
+    )
+    run_parser.set_defaults(func=run)
+
+    list_parser = subparsers.add_parser("list", help="List the tasks.")
+    list_parser.set_defaults(func=list_tasks)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,38 @@
 import spotipy
 import os
 import logging
+from cache import CachedSpotify, ResponseCache
+from rate_limit import RateLimitedSpotify
+from token_provider import get_token_provider
+
+# The scopes needed by all extraction jobs. Every token is requested with all of
+# them, so the jobs share one token cache without invalidating each other's token.
+SCOPES = " ".join(
+    [
+        "user-library-read",
+        "user-read-recently-played",
+        "user-top-read",
+        "playlist-read-private",
+    ]
+)
+
+
+class SpotifyClient(CachedSpotify, RateLimitedSpotify):
+    """
+    A Spotify client answering catalog requests from the response cache and
+    sending all other requests through the shared rate limiter.
+    """
+
 
 def connect2spotify(scope: str) -> spotipy.Spotify:
     """
-    Connects to the Spotify API using the provided scope.
+    Connects to the Spotify API with a token covering the provided scope.
+
+    The token is requested with SCOPES and the provided scope, so every job shares
+    one token provider and one token cache at SPOTIFY_TOKEN_CACHE_PATH. Every request
+    goes through the rate limiter shared by the process. If SPOTIFY_RESPONSE_CACHE is
+    set to true, responses of catalog endpoints are cached on disk at
+    SPOTIFY_RESPONSE_CACHE_PATH.
 
     Args:
         scope (str): The scope of the Spotify API access.
@@ -13,14 +41,21 @@ def connect2spotify(scope: str) -> spotipy.Spotify:
         spotipy.Spotify: An authenticated Spotify client.
     """
     try:
-        sp = spotipy.Spotify(
-            auth_manager=spotipy.oauth2.SpotifyOAuth(
-                client_id=os.environ.get("SPOTIFY_CLIENT_ID"),
-                client_secret=os.environ.get("SPOTIFY_CLIENT_SECRET"),
-                redirect_uri="http://localhost:7777/callback",
-                scope=scope,
+        scopes = set(SCOPES.split()) | set(scope.split())
+        auth_manager = get_token_provider(" ".join(sorted(scopes)))
+        # Fetched up front, so authorization errors surface here and not in a job
+        auth_manager.get_access_token()
+
+        if os.environ.get("SPOTIFY_RESPONSE_CACHE", "false").lower() == "true":
+            cache = ResponseCache(
+                os.environ.get(
+                    "SPOTIFY_RESPONSE_CACHE_PATH", "cache/spotify_responses.sqlite"
+                )
             )
-        )
+            sp = SpotifyClient(auth_manager=auth_manager, cache=cache)
+        else:
+            sp = RateLimitedSpotify(auth_manager=auth_manager)
+
         logging.info("Successfully connected to Spotify API")
         return sp
     except Exception as e:
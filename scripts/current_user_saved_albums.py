@@ -1,73 +1,82 @@
 # Description: This script gets the albums and tracks data from the current user's saved albums on Spotify API.
+import spotipy
 import pandas as pd
 import os
 import logging
-from load2bq import load2bq
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from changes import load_changes
+from job import init_job
+from mapping import compile_table
+from artists import load_artists
+from audio_features import load_audio_features
+from dimensions import intern_items, load_dimensions, normalise
 from validations import check_if_valid_data
 from connect_to_spotify import connect2spotify
+from pagination import fetch_all_pages, fetch_added_since, MAX_WORKERS
+from state import load_watermark, save_watermark
 
-load_dotenv()
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s :: %(levelname)s :: %(message)s",
-    filename=f"logs/{os.path.basename(__file__).split('.')[0]}.log",
-)
+# The multiple albums endpoint accepts at most 20 IDs per request.
+ALBUMS_BATCH_SIZE = 20
 
-logging.info("The job of getting the albums and tracks data started.")
 
-sp = connect2spotify("user-library-read")
+def get_albums(sp: spotipy.Spotify, watermark: str | None = None) -> pd.DataFrame:
+    if watermark is None:
+        saved_albums = fetch_all_pages(sp.current_user_saved_albums)
+    else:
+        saved_albums = fetch_added_since(sp.current_user_saved_albums, watermark)
 
+    intern_items("my_albums", saved_albums)
+    return compile_table("my_albums")(saved_albums)
 
-def get_albums() -> pd.DataFrame:
-    saved_albums = sp.current_user_saved_albums(limit=50, offset=1)
-    albums = []
 
-    for album in saved_albums["items"]:
-        album_row = {
-            "album_id": album["album"]["id"],
-            "album_name": album["album"]["name"],
-            "album_label": album["album"]["label"],
-            "album_popularity": album["album"]["popularity"],
-            "album_release_date": album["album"]["release_date"],
-            "album_total_tracks": album["album"]["total_tracks"],
-            "album_url": album["album"]["external_urls"]["spotify"],
-            "album_type": album["album"]["type"],
-            "artist_id": album["album"]["artists"][0]["id"],
-            "artist_name": album["album"]["artists"][0]["name"],
-            "aded_at": album["added_at"],
-        }
-        albums.append(album_row)
+def get_album_track_items(sp: spotipy.Spotify, album: dict) -> list[dict]:
+    tracks = album["tracks"]
+    if tracks["next"] is None:
+        return tracks["items"]
 
-    return pd.DataFrame(albums)
+    logging.info(
+        "Album %s has %d tracks, fetching the remaining pages",
+        album["id"],
+        tracks["total"],
+    )
+    return fetch_all_pages(sp.album_tracks, first_page=tracks, album_id=album["id"])
 
 
-def get_albums_tracks(album_id_list: list) -> pd.DataFrame:
+def get_albums_tracks(sp: spotipy.Spotify, album_id_list: list) -> pd.DataFrame:
     album_tracks = []
+    album_ids = []
+    batches = [
+        album_id_list[i : i + ALBUMS_BATCH_SIZE]
+        for i in range(0, len(album_id_list), ALBUMS_BATCH_SIZE)
+    ]
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        albums = [
+            album
+            for batch in executor.map(sp.albums, batches)
+            for album in batch["albums"]
+        ]
+        albums_track_items = executor.map(
+            lambda album: get_album_track_items(sp, album), albums
+        )
+
+        for album, items in zip(albums, albums_track_items):
+            album_tracks.extend(items)
+            album_ids.extend([album["id"]] * len(items))
+            # The tracks of an album do not reference it, so the album is attached
+            intern_items("album_tracks", [{"album": album, **item} for item in items])
+
+    return compile_table("album_tracks")(album_tracks, album_id=album_ids)
+
+
+def load_albums(sp: spotipy.Spotify) -> tuple[pd.DataFrame, str | None]:
+    logging.info("The job of getting the albums and tracks data started.")
+
+    watermark = load_watermark("my_albums")
+    load_type = "WRITE_TRUNCATE" if watermark is None else "WRITE_APPEND"
 
-    for i in album_id_list:
-        albums_tracks = sp.album_tracks(i, limit=50, offset=1)
-        for item in albums_tracks["items"]:
-            album_track_row = {
-                "album_id": i,
-                "track_id": item["id"],
-                "track_name": item["name"],
-                "item_type": item["type"],
-                "track_duration": item["duration_ms"],
-                "explicit": item["explicit"],
-                "is_local": item["is_local"],
-                "track_number": item["track_number"],
-                "artist_id": item["artists"][0]["id"],
-                "artist_name": item["artists"][0]["name"],
-            }
-            album_tracks.append(album_track_row)
-    return pd.DataFrame(album_tracks)
-
-
-def main():
     try:
-        albums = get_albums()
-        album_ids = albums.album_id.tolist()
+        albums = get_albums(sp, watermark)
         logging.info(
             "Albums data successfully extracted from API, proceeding to validation stage"
         )
@@ -75,24 +84,51 @@ def main():
         logging.exception("Something went wrong while extracting albums data from API")
         raise
 
-    if check_if_valid_data(albums, "album_id"):
-        logging.info("Data valid for my albums table, proceeding to load stage")
-        load2bq(albums, "my_albums")
+    if not check_if_valid_data(albums, "album_id"):
+        return pd.DataFrame(), watermark
+
+    logging.info("Data valid for my albums table, proceeding to load stage")
+    load_changes(*normalise(albums, "my_albums"), ["album_id"], load_type)
+    return albums, watermark
+
+
+def load_album_tracks(sp: spotipy.Spotify, albums: pd.DataFrame, watermark: str | None):
+    if albums.empty:
+        return
+
+    load_type = "WRITE_TRUNCATE" if watermark is None else "WRITE_APPEND"
+
+    try:
+        album_tracks = get_albums_tracks(sp, albums.album_id.tolist())
+        logging.info(
+            "Album tracks data successfully extracted from API, proceeding to validation stage"
+        )
+    except:
+        logging.exception(
+            "Something went wrong while extracting album tracks data from API"
+        )
+        raise
+
+    if check_if_valid_data(album_tracks, "album_id", "track_id"):
+        logging.info("Data valid for album tracks table, proceeding to Load stage")
+        load_changes(
+            *normalise(album_tracks, "album_tracks"),
+            ["album_id", "track_id"],
+            load_type
+        )
+
+    save_watermark("my_albums", albums["aded_at"].max(), full_sync=watermark is None)
 
-        try:
-            album_tracks = get_albums_tracks(album_ids)
-            logging.info(
-                "Album tracks data successfully extracted from API, proceeding to validation stage"
-            )
-        except:
-            logging.exception(
-                "Something went wrong while extracting album tracks data from API"
-            )
-            raise
 
-        if check_if_valid_data(album_tracks):
-            logging.info("Data valid for album tracks table, proceeding to Load stage")
-            load2bq(album_tracks, "album_tracks")
+def main(sp: spotipy.Spotify):
+    albums, watermark = load_albums(sp)
+    load_album_tracks(sp, albums, watermark)
 
 
-main()
+if __name__ == "__main__":
+    init_job(os.path.basename(__file__).split(".")[0])
+    sp = connect2spotify("user-library-read")
+    main(sp)
+    load_audio_features(sp)
+    load_artists(sp)
+    load_dimensions()
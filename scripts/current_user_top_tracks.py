@@ -1,58 +1,105 @@
-# Description: This script gets the saved tracks of the user and loads them into BigQuery.
+# Description: This script gets the top tracks of the user, loads them into BigQuery and keeps a daily history of their ranks.
+import spotipy
 import pandas as pd
 import os
 import logging
-from load2bq import load2bq
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from sinks import get_sink
+from job import init_job
+from mapping import compile_table
+from artists import load_artists
+from audio_features import load_audio_features
+from dimensions import intern_items, load_dimensions, normalise
 from validations import check_if_valid_data
 from connect_to_spotify import connect2spotify
+from pagination import fetch_all_pages
+from state import load_state, save_state
 
-load_dotenv()
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s :: %(levelname)s :: %(message)s",
-    filename=f"logs/{os.path.basename(__file__).split('.')[0]}.log",
-)
-logging.info("The job of getting the top tracks started.")
+TIME_RANGES = ["short_term", "medium_term", "long_term"]
 
-sp = connect2spotify("user-library-read")
 
+def get_top_track_items(sp: spotipy.Spotify, time_range: str) -> list[dict]:
+    return fetch_all_pages(sp.current_user_top_tracks, time_range=time_range)
 
-def get_top_tracks() -> pd.DataFrame:
-    ranges = ["short_term", "medium_term", "long_term"]
+
+def get_top_tracks(sp: spotipy.Spotify) -> pd.DataFrame:
     top_tracks_list = []
+    time_ranges = []
+    ranks = []
+
+    with ThreadPoolExecutor(max_workers=len(TIME_RANGES)) as executor:
+        ranges_items = executor.map(
+            lambda time_range: get_top_track_items(sp, time_range), TIME_RANGES
+        )
+
+        for time_range, items in zip(TIME_RANGES, ranges_items):
+            top_tracks_list.extend(items)
+            time_ranges.extend([time_range] * len(items))
+            ranks.extend(range(1, len(items) + 1))
+
+    intern_items("my_top_tracks", top_tracks_list)
+    return compile_table("my_top_tracks")(
+        top_tracks_list, time_range=time_ranges, rank=ranks
+    )
+
+
+def get_previous_ranks(snapshots: dict, snapshot_date: str) -> pd.DataFrame:
+    """
+    Returns the ranks of the latest snapshot taken before the given date.
+
+    Args:
+        snapshots (dict): The saved snapshots, {date: {time_range: {track_id: rank}}}.
+        snapshot_date (str): The date of the current snapshot.
+
+    Returns:
+        pd.DataFrame: The time_range, track_id and previous_rank of every track.
+    """
+    previous_dates = [date for date in snapshots if date < snapshot_date]
+    ranks = snapshots[max(previous_dates)] if previous_dates else {}
+
+    return pd.DataFrame(
+        [
+            (time_range, track_id, rank)
+            for time_range, range_ranks in ranks.items()
+            for track_id, rank in range_ranks.items()
+        ],
+        columns=["time_range", "track_id", "previous_rank"],
+    )
+
+
+def get_rank_history(
+    top_tracks: pd.DataFrame, previous_ranks: pd.DataFrame, snapshot_date: str
+) -> pd.DataFrame:
+    history = top_tracks[["time_range", "track_id", "rank"]].astype(
+        {"time_range": str, "track_id": str}
+    )
+    history = history.merge(previous_ranks, how="left", on=["time_range", "track_id"])
+    # Positive deltas are tracks climbing the ranking
+    history["rank_delta"] = history["previous_rank"] - history["rank"]
+    history.insert(0, "snapshot_date", snapshot_date)
+    return history
+
+
+def save_snapshot(top_tracks: pd.DataFrame, snapshots: dict, snapshot_date: str):
+    ranks = {}
+    for time_range, track_id, rank in zip(
+        top_tracks["time_range"], top_tracks["track_id"], top_tracks["rank"]
+    ):
+        ranks.setdefault(str(time_range), {})[track_id] = int(rank)
+
+    # Only the latest earlier snapshot is needed to compute the next deltas
+    previous_dates = sorted(date for date in snapshots if date < snapshot_date)
+    snapshots = {date: snapshots[date] for date in previous_dates[-1:]}
+    snapshots[snapshot_date] = ranks
+    save_state("top_tracks_snapshots", snapshots)
+
+
+def main(sp: spotipy.Spotify):
+    logging.info("The job of getting the top tracks started.")
 
-    for range in ranges:
-        top_tracks = sp.current_user_top_tracks(limit=50, offset=0, time_range=range)
-        for track in top_tracks["items"]:
-            tracks_row = {
-                "time_range": range,
-                "track_id": track["id"],
-                "track_name": track["name"],
-                "track_duration": track["duration_ms"],
-                "explicit": track["explicit"],
-                "track_url": track["external_urls"]["spotify"],
-                "is_local": track["is_local"],
-                "popularity": track["popularity"],
-                "type": track["type"],
-                "track_number": track["track_number"],
-                "album_type": track["album"]["type"],
-                "album_album_type": track["album"]["album_type"],
-                "album_id": track["album"]["id"],
-                "album_name": track["album"]["name"],
-                "album_release_date": track["album"]["release_date"],
-                "album_total_tracks": track["album"]["total_tracks"],
-                "artist_id": track["artists"][0]["id"],
-                "artist_name": track["artists"][0]["name"],
-            }
-            top_tracks_list.append(tracks_row)
-
-    return pd.DataFrame(top_tracks_list)
-
-
-def main():
     try:
-        top_tracks = get_top_tracks()
+        top_tracks = get_top_tracks(sp)
         logging.info(
             "Data successfully extracted from API, proceeding to validation stage"
         )
@@ -62,7 +109,27 @@ def main():
 
     if check_if_valid_data(top_tracks, "time_range", "track_id"):
         logging.info("Data valid for top tracks table, proceeding to load stage")
-        load2bq(top_tracks, "my_top_tracks")
+        get_sink().load(*normalise(top_tracks, "my_top_tracks"))
+
+        snapshot_date = datetime.now(timezone.utc).date().isoformat()
+        snapshots = load_state("top_tracks_snapshots")
+        history = get_rank_history(
+            top_tracks, get_previous_ranks(snapshots, snapshot_date), snapshot_date
+        )
+        # Replacing the rows of the day keeps reruns on the same day idempotent
+        get_sink().replace_rows(
+            history,
+            "my_top_tracks_history",
+            key="snapshot_date",
+            keys=[snapshot_date],
+        )
+        save_snapshot(top_tracks, snapshots, snapshot_date)
 
 
-main()
+if __name__ == "__main__":
+    init_job(os.path.basename(__file__).split(".")[0])
+    sp = connect2spotify("user-top-read")
+    main(sp)
+    load_audio_features(sp)
+    load_artists(sp)
+    load_dimensions()
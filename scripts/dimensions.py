@@ -0,0 +1,216 @@
+# Description: This script splits the wide extracted tables into shared dimension tables and narrow fact tables.
+import logging
+import os
+import threading
+from functools import lru_cache
+import pandas as pd
+from mapping import compile_path, compile_table
+from schemas import FACT_COLUMNS
+from sinks import get_sink
+
+# Path of the object interned from the API items of each table, and what it is.
+# Tracks and albums also intern their album and their credited artists.
+INTERNED_OBJECTS = {
+    "saved_tracks": ("track", "track"),
+    "my_albums": ("album", "album"),
+    "album_tracks": ("track", None),
+    "saved_episodes": ("show", "episode.show"),
+    "saved_shows": ("show", "show"),
+    "my_top_tracks": ("track", None),
+    "my_played_tracks": ("track", "track"),
+    "my_playlists_tracks": ("track", "track"),
+}
+
+DIMENSION_KEYS = {
+    "dim_artist": "artist_id",
+    "dim_album": "album_id",
+    "dim_track": "track_id",
+    "dim_show": "show_id",
+}
+
+
+def is_enabled() -> bool:
+    return os.environ.get("NORMALISED_TABLES", "false").lower() == "true"
+
+
+def is_collecting_track_ids() -> bool:
+    return os.environ.get("AUDIO_FEATURES", "false").lower() == "true"
+
+
+def is_collecting_artists() -> bool:
+    return os.environ.get("ARTIST_ENRICHMENT", "false").lower() == "true"
+
+
+class DimensionIndex:
+    """
+    An in-memory index of the artists, albums, tracks and shows seen in a run, by Spotify ID.
+
+    Every ID is kept once. When the same ID is seen again, the object with more
+    fields wins, so a full track object replaces the simplified one of an album.
+    """
+
+    def __init__(self):
+        self._objects = {table_id: {} for table_id in DIMENSION_KEYS}
+        self._lock = threading.Lock()
+
+    def _intern(self, table_id: str, obj: dict | None):
+        if not obj or obj.get("id") is None:
+            return
+        objects = self._objects[table_id]
+        known = objects.get(obj["id"])
+        if known is None or len(known) < len(obj):
+            objects[obj["id"]] = obj
+
+    def _intern_album(self, album: dict | None):
+        self._intern("dim_album", album)
+        for artist in (album or {}).get("artists") or []:
+            self._intern("dim_artist", artist)
+
+    def _intern_track(self, track: dict | None):
+        self._intern("dim_track", track)
+        self._intern_album((track or {}).get("album"))
+        for artist in (track or {}).get("artists") or []:
+            self._intern("dim_artist", artist)
+
+    def add_items(self, table_id: str, items: list[dict]):
+        """
+        Interns the objects referenced by the API items of a table.
+
+        Args:
+            table_id (str): The wide table the items were extracted for.
+            items (list[dict]): The API items.
+        """
+        kind, path = INTERNED_OBJECTS[table_id]
+        get = compile_path(path) if path else lambda item: item
+        intern = {
+            "track": self._intern_track,
+            "album": self._intern_album,
+            "show": lambda show: self._intern("dim_show", show),
+        }[kind]
+
+        with self._lock:
+            for item in items:
+                intern(get(item))
+
+    def pop_tables(self) -> dict[str, pd.DataFrame]:
+        """
+        Builds the dimension tables and empties the index.
+
+        Returns:
+            dict[str, pd.DataFrame]: The non-empty dimension tables, by table name.
+        """
+        with self._lock:
+            objects, self._objects = self._objects, {
+                table_id: {} for table_id in DIMENSION_KEYS
+            }
+
+        return {
+            table_id: compile_table(table_id)(list(rows.values()))
+            for table_id, rows in objects.items()
+            if rows
+        }
+
+
+@lru_cache(maxsize=None)
+def get_index() -> DimensionIndex:
+    return DimensionIndex()
+
+
+class ExtractedTracks:
+    """
+    The distinct tracks and artists extracted in a run, for the enrichment stages.
+
+    Every credited artist of a track is kept in order, not only the first one.
+    """
+
+    def __init__(self):
+        self._credits = {}
+        self._artist_ids = set()
+        self._lock = threading.Lock()
+
+    def add_items(self, table_id: str, items: list[dict]):
+        """
+        Collects the tracks and artists referenced by the API items of a table.
+
+        Args:
+            table_id (str): The wide table the items were extracted for.
+            items (list[dict]): The API items.
+        """
+        kind, path = INTERNED_OBJECTS[table_id]
+        if kind == "show":
+            return
+        get = compile_path(path) if path else lambda item: item
+
+        credits = {}
+        artist_ids = set()
+        for obj in map(get, items):
+            if not obj or obj.get("id") is None:
+                continue
+            ids = [artist["id"] for artist in obj.get("artists") or [] if artist["id"]]
+            artist_ids.update(ids)
+            # Playlists also hold episodes and local files, which are not enriched
+            if kind == "track" and obj.get("type", "track") == "track":
+                credits[obj["id"]] = ids
+
+        with self._lock:
+            self._credits.update(credits)
+            self._artist_ids |= artist_ids
+
+    def track_ids(self) -> list[str]:
+        with self._lock:
+            return sorted(self._credits)
+
+    def pop_credits(self) -> tuple[dict[str, list[str]], list[str]]:
+        """
+        Returns the collected artist credits and empties the collection.
+
+        Returns:
+            tuple[dict[str, list[str]], list[str]]: The artist IDs of every track in
+            credit order, and the distinct artist IDs of all tracks and albums.
+        """
+        with self._lock:
+            credits, self._credits = self._credits, {}
+            artist_ids, self._artist_ids = self._artist_ids, set()
+        return credits, sorted(artist_ids)
+
+
+@lru_cache(maxsize=None)
+def get_extracted_tracks() -> ExtractedTracks:
+    return ExtractedTracks()
+
+
+def intern_items(table_id: str, items: list[dict]):
+    if is_enabled():
+        get_index().add_items(table_id, items)
+    if is_collecting_track_ids() or is_collecting_artists():
+        get_extracted_tracks().add_items(table_id, items)
+
+
+def normalise(data: pd.DataFrame, table_id: str) -> tuple[pd.DataFrame, str]:
+    """
+    Returns the narrow fact table to load in place of a wide table.
+
+    Args:
+        data (pd.DataFrame): The wide table.
+        table_id (str): The name of the wide table.
+
+    Returns:
+        tuple[pd.DataFrame, str]: The fact table and its name, or the wide table
+        unchanged if NORMALISED_TABLES is disabled.
+    """
+    if not is_enabled() or table_id not in FACT_COLUMNS:
+        return data, table_id
+    return data[FACT_COLUMNS[table_id]], f"fact_{table_id}"
+
+
+def load_dimensions():
+    """
+    Loads every dimension row interned during the run, replacing rows with the same ID.
+    """
+    if not is_enabled():
+        return
+
+    for table_id, data in get_index().pop_tables().items():
+        key = DIMENSION_KEYS[table_id]
+        logging.info("Loading %d rows to %s", len(data), table_id)
+        get_sink().replace_rows(data, table_id, key=key, keys=data[key].tolist())
@@ -0,0 +1,92 @@
+# Description: This script converts the extracted DataFrames to compact dtypes derived from the table schemas.
+import logging
+import numpy as np
+import pandas as pd
+from schemas import SCHEMAS
+
+# String columns with few distinct values, stored as categories
+CATEGORY_COLUMNS = {
+    "time_range",
+    "type",
+    "item_type",
+    "track_type",
+    "album_type",
+    "album_album_type",
+    "artist_type",
+    "playlist_type",
+    "playlist_owner_type",
+    "show_media_type",
+    "language",
+    "artist_name",
+    "genre",
+    "album_label",
+    "show_publisher",
+    "added_by",
+    "playlist_id",
+}
+
+# Nullable integer dtypes from the smallest to the largest
+INTEGER_DTYPES = ["Int8", "Int16", "Int32", "Int64"]
+
+try:
+    import pyarrow  # noqa: F401
+
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = "string"
+
+
+def get_integer_dtype(values: pd.Series) -> str:
+    values = values.dropna()
+    if values.empty:
+        return INTEGER_DTYPES[0]
+    low, high = values.min(), values.max()
+    for dtype in INTEGER_DTYPES:
+        info = np.iinfo(dtype.lower())
+        if info.min <= low and high <= info.max:
+            return dtype
+    return INTEGER_DTYPES[-1]
+
+
+def compact(data: pd.DataFrame, table_id: str) -> pd.DataFrame:
+    """
+    Converts the schema columns of a DataFrame to compact dtypes.
+
+    Low cardinality strings become categories, other strings Arrow backed strings,
+    integers the smallest nullable integer type holding their values and booleans
+    nullable booleans. Columns without values in the frame keep their dtype.
+
+    Args:
+        data (pd.DataFrame): The DataFrame built from the API items.
+        table_id (str): The table whose schema gives the column types.
+
+    Returns:
+        pd.DataFrame: The DataFrame with compact dtypes.
+    """
+    if data.empty:
+        return data
+
+    before = data.memory_usage(deep=True).sum()
+    dtypes = {}
+    for column in SCHEMAS[table_id]:
+        if column.name not in data or data[column.name].isna().all():
+            continue
+        if column.type == "INTEGER":
+            dtypes[column.name] = get_integer_dtype(data[column.name])
+        elif column.type == "BOOLEAN":
+            dtypes[column.name] = "boolean"
+        elif column.type == "STRING":
+            dtypes[column.name] = (
+                "category" if column.name in CATEGORY_COLUMNS else STRING_DTYPE
+            )
+
+    data = data.astype(dtypes)
+    after = data.memory_usage(deep=True).sum()
+    logging.info(
+        "Typed %d rows of %s: %.2f MB -> %.2f MB",
+        len(data),
+        table_id,
+        before / 2**20,
+        after / 2**20,
+    )
+    return data
@@ -0,0 +1,117 @@
+# Description: This script contains the object store and the batched fetch shared by the jobs enriching extracted tracks.
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from pagination import MAX_WORKERS
+
+# The number of IDs looked up in an object store per query
+LOOKUP_BATCH_SIZE = 500
+
+
+class ObjectStore:
+    """
+    A SQLite backed store of the API objects fetched so far by ID, and when they were fetched.
+
+    Objects are fetched again once they are older than the time to live, or kept
+    forever without one. IDs the API returned nothing for are stored as null, so they
+    are not requested again either.
+
+    Use it as a context manager, the connection is closed on exit.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float | None = None,
+        lookup_batch_size: int = LOOKUP_BATCH_SIZE,
+    ):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.lookup_batch_size = lookup_batch_size
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS objects (
+                id TEXT PRIMARY KEY,
+                object TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def stale(self, ids: list[str]) -> list[str]:
+        """
+        Returns the IDs never fetched, or fetched longer than the time to live ago.
+
+        Only the given IDs are looked up, in batches of lookup_batch_size.
+
+        Args:
+            ids (list[str]): The IDs of the extracted objects.
+
+        Returns:
+            list[str]: The IDs to fetch, in the given order.
+        """
+        fetched_after = time.time() - self.ttl if self.ttl is not None else 0.0
+        fresh = set()
+        with self._lock:
+            for i in range(0, len(ids), self.lookup_batch_size):
+                batch = ids[i : i + self.lookup_batch_size]
+                fresh.update(
+                    row[0]
+                    for row in self._connection.execute(
+                        "SELECT id FROM objects WHERE fetched_at >= ? "
+                        f"AND id IN ({', '.join('?' * len(batch))})",
+                        [fetched_after, *batch],
+                    )
+                )
+        return [id_ for id_ in ids if id_ not in fresh]
+
+    def put(self, objects: dict[str, dict | None]):
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO objects VALUES (?, ?, ?)",
+                [(id_, json.dumps(item), now) for id_, item in objects.items()],
+            )
+            self._connection.commit()
+
+
+def fetch_batches(
+    fetch_batch: Callable[[list[str]], list[dict | None]],
+    ids: list[str],
+    batch_size: int,
+    max_workers: int = MAX_WORKERS,
+) -> dict[str, dict | None]:
+    """
+    Fetches objects by ID in concurrent batches.
+
+    Args:
+        fetch_batch (Callable[[list[str]], list[dict | None]]): Fetches the objects of a batch of IDs, in the order of the IDs.
+        ids (list[str]): The IDs of the objects.
+        batch_size (int): The maximum number of IDs of the endpoint.
+        max_workers (int): The maximum number of batches requested at the same time.
+
+    Returns:
+        dict[str, dict | None]: The objects by ID, None for IDs without an object.
+    """
+    batches = [ids[i : i + batch_size] for i in range(0, len(ids), batch_size)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        objects = {}
+        for batch, items in zip(batches, executor.map(fetch_batch, batches)):
+            objects.update(zip(batch, items))
+    return objects
@@ -0,0 +1,25 @@
+# Description: This script contains the setup shared by the entry points of the extraction jobs.
+import atexit
+import logging
+from dotenv import load_dotenv
+from metrics import get_metrics
+
+
+def init_job(name: str):
+    """
+    Loads the environment variables from the .env file and configures logging.
+
+    This is only called by entry points, so importing a job module has no side effects.
+    The metrics of the run are written to logs/<name>.prom and logs/<name>.metrics.json
+    when the process exits.
+
+    Args:
+        name (str): The name of the job, used for the log file logs/<name>.log.
+    """
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s :: %(levelname)s :: %(threadName)s :: %(message)s",
+        filename=f"logs/{name}.log",
+    )
+    atexit.register(get_metrics().export, name)
@@ -1,30 +1,198 @@
 # Description: Load data to BigQuery
-from google.cloud import bigquery
+from __future__ import annotations
+from functools import lru_cache
+from typing import TYPE_CHECKING
 import pandas as pd
 import os
-from dotenv import load_dotenv
+import uuid
+from schemas import SCHEMAS
 
-load_dotenv()
+# google-cloud-bigquery is slow to import, so it is only imported once something is loaded
+if TYPE_CHECKING:
+    from google.cloud import bigquery
 
+# Nullable pandas dtypes keep integer and boolean columns intact when they contain nulls
+PANDAS_DTYPES = {"INTEGER": "Int64", "FLOAT": "float64", "BOOLEAN": "boolean"}
 
-def load2bq(data: pd.DataFrame, table_id: str, load_type: str = "WRITE_TRUNCATE"):
-    project_id = os.environ["GCP_PROJECT_ID"]
-    dataset_id = os.environ["dataset_id"]
-    table_id = table_id
 
-    client = bigquery.Client(project=project_id)
-    dataset = client.dataset(dataset_id)
-    table = dataset.table(table_id)
+@lru_cache(maxsize=None)
+def get_client() -> bigquery.Client:
+    """
+    Returns the BigQuery client shared by every load in the process.
+
+    Returns:
+        bigquery.Client: A BigQuery client for the GCP_PROJECT_ID project.
+    """
+    from google.cloud import bigquery
+
+    return bigquery.Client(project=os.environ["GCP_PROJECT_ID"])
+
+
+def get_table_ref(table_id: str) -> str:
+    return f"{os.environ['GCP_PROJECT_ID']}.{os.environ['dataset_id']}.{table_id}"
+
+
+def apply_schema(data: pd.DataFrame, table_id: str) -> pd.DataFrame:
+    """
+    Orders and casts the columns of the DataFrame as declared in the table schema.
+
+    Args:
+        data (pd.DataFrame): DataFrame to load.
+        table_id (str): The table whose schema is applied.
+
+    Returns:
+        pd.DataFrame: The DataFrame with the schema columns, in schema order.
+    """
+    schema = SCHEMAS[table_id]
+    data = data[[column.name for column in schema]]
+
+    return data.astype(
+        {
+            column.name: PANDAS_DTYPES[column.type]
+            for column in schema
+            if column.type in PANDAS_DTYPES
+        }
+    )
+
+
+def load2bq(
+    data: pd.DataFrame,
+    table_id: str,
+    load_type: str = "WRITE_TRUNCATE",
+    destination: str | None = None,
+) -> bigquery.LoadJob:
+    from google.cloud import bigquery
+
+    client = get_client()
+    # A staging table is loaded with the schema of the table it is published to
+    table = get_table_ref(destination or table_id)
 
     job_config = bigquery.LoadJobConfig(
-        autodetect=False,
-        source_format=bigquery.SourceFormat.CSV,
+        source_format=bigquery.SourceFormat.PARQUET,
         write_disposition=load_type,
+        schema=[
+            bigquery.SchemaField(column.name, column.type)
+            for column in SCHEMAS[table_id]
+        ],
     )
 
     try:
-        client.load_table_from_dataframe(data, table, job_config=job_config)
-        print(f"Loaded {len(data)} rows to {table}")
+        job = client.load_table_from_dataframe(
+            apply_schema(data, table_id), table, job_config=job_config
+        )
+        job.result()
+        print(f"Loaded {job.output_rows} rows to {table}")
+        return job
     except:
         print("Something went wrong while loading data to BigQuery")
         raise
+
+
+def publish2bq(
+    staging_id: str,
+    table_id: str,
+    load_type: str,
+    replace: tuple[str, list] | None,
+    keys: tuple[str, ...],
+):
+    from google.cloud import bigquery
+
+    client = get_client()
+    table = get_table_ref(table_id)
+    staging = get_table_ref(staging_id)
+
+    try:
+        if keys:
+            duplicates = client.query(
+                f"SELECT 1 FROM `{staging}` GROUP BY {', '.join(keys)} "
+                "HAVING COUNT(*) > 1 LIMIT 1"
+            ).result()
+            if duplicates.total_rows:
+                raise ValueError("Primary Key check is violated")
+
+        if replace is None:
+            client.copy_table(
+                staging,
+                table,
+                job_config=bigquery.CopyJobConfig(write_disposition=load_type),
+            ).result()
+        else:
+            # The rows are replaced in one transaction, so readers never miss them
+            key, values = replace
+            client.query(
+                f"""
+                CREATE TABLE IF NOT EXISTS `{table}` LIKE `{staging}`;
+                BEGIN TRANSACTION;
+                DELETE FROM `{table}` WHERE {key} IN UNNEST(@keys);
+                INSERT INTO `{table}` SELECT * FROM `{staging}`;
+                COMMIT TRANSACTION;
+                """,
+                job_config=bigquery.QueryJobConfig(
+                    query_parameters=[
+                        bigquery.ArrayQueryParameter("keys", "STRING", values)
+                    ]
+                ),
+            ).result()
+        print(f"Published {staging} to {table}")
+    except:
+        print("Something went wrong while publishing data in BigQuery")
+        raise
+    finally:
+        client.delete_table(staging, not_found_ok=True)
+
+
+def merge2bq(data: pd.DataFrame, table_id: str, keys: list[str], deleted: pd.DataFrame):
+    from google.cloud import bigquery
+
+    client = get_client()
+    table = get_table_ref(table_id)
+    # Unique, so concurrent runs never share a staging table
+    staging = f"{table}_changes_{uuid.uuid4().hex}"
+    columns = [column.name for column in SCHEMAS[table_id]]
+
+    # The changed rows and the keys of the deleted rows are staged in one table
+    changes = pd.concat(
+        [
+            apply_schema(data, table_id).assign(_deleted=False),
+            apply_schema(deleted.reindex(columns=columns), table_id).assign(
+                _deleted=True
+            ),
+        ],
+        ignore_index=True,
+    )
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        write_disposition="WRITE_TRUNCATE",
+        schema=[
+            bigquery.SchemaField(column.name, column.type)
+            for column in SCHEMAS[table_id]
+        ]
+        + [bigquery.SchemaField("_deleted", "BOOLEAN")],
+    )
+
+    condition = " AND ".join(f"T.{key} = S.{key}" for key in keys)
+    query = f"""
+        MERGE `{table}` T
+        USING `{staging}` S
+        ON {condition}
+        WHEN MATCHED AND S._deleted THEN DELETE
+        WHEN MATCHED THEN
+            UPDATE SET {", ".join(f"{column} = S.{column}" for column in columns)}
+        WHEN NOT MATCHED AND NOT S._deleted THEN
+            INSERT ({", ".join(columns)})
+            VALUES ({", ".join(f"S.{column}" for column in columns)})
+    """
+
+    try:
+        client.load_table_from_dataframe(
+            changes, staging, job_config=job_config
+        ).result()
+        client.query(query).result()
+        print(
+            f"Merged {len(data)} changed and {len(deleted)} deleted rows into {table}"
+        )
+    except:
+        print("Something went wrong while merging data into BigQuery")
+        raise
+    finally:
+        client.delete_table(staging, not_found_ok=True)
@@ -4,20 +4,10 @@ import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import logging
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s :: %(levelname)s :: %(message)s",
-    filename=f"logs/{os.path.basename(__file__).split('.')[0]}.log",
-)
-logging.info("Email send job started.")
 
 
 def send_email(subject: str, body: str, sender_email: str = "", to: str = ""):
+    logging.info("Email send job started.")
     msg = MIMEMultipart()
 
     msg["From"] = sender_email
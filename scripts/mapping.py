@@ -0,0 +1,63 @@
+# Description: This script compiles the column paths declared in schemas.py into functions building DataFrames from API items.
+from functools import lru_cache
+from typing import Any, Callable
+import pandas as pd
+from dtypes import compact
+from metrics import get_metrics
+from schemas import SCHEMAS
+
+
+def compile_path(path: str) -> Callable[[dict], Any]:
+    """
+    Compiles a dotted path into a function reading the value at that path.
+
+    Args:
+        path (str): Dotted path of the value, list indexes are given as numbers, e.g. "track.artists.0.id".
+
+    Returns:
+        Callable[[dict], Any]: A function returning the value, or None if any part of the path is missing or null.
+    """
+    keys = [int(key) if key.isdigit() else key for key in path.split(".")]
+
+    def get(item: dict) -> Any:
+        try:
+            for key in keys:
+                item = item[key]
+            return item
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    return get
+
+
+@lru_cache(maxsize=None)
+def compile_table(table_id: str) -> Callable[..., pd.DataFrame]:
+    """
+    Compiles the schema of a table into a function building the table from API items.
+
+    Args:
+        table_id (str): The table whose schema is compiled.
+
+    Returns:
+        Callable[..., pd.DataFrame]: A function taking the API items, and the values of
+        the columns without a path as keyword arguments, either one value for all rows
+        or a list with one value per item.
+    """
+    schema = SCHEMAS[table_id]
+    getters = [
+        (column.name, compile_path(column.path)) for column in schema if column.path
+    ]
+    names = [column.name for column in schema]
+
+    def build(items: list[dict], **values) -> pd.DataFrame:
+        with get_metrics().span("transform", table=table_id):
+            columns = {name: [get(item) for item in items] for name, get in getters}
+            for name, value in values.items():
+                columns[name] = (
+                    value if isinstance(value, list) else [value] * len(items)
+                )
+            data = compact(pd.DataFrame(columns, columns=names), table_id)
+        get_metrics().inc("rows_extracted", len(items), table=table_id)
+        return data
+
+    return build
@@ -0,0 +1,187 @@
+# Description: This script contains the timing spans and counters recorded during a run and their export to logs/.
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache, wraps
+
+PREFIX = "spotify_etl"
+
+# Path segments holding an ID, e.g. the playlist ID in playlists/{id}/tracks
+ID_SEGMENT = re.compile(r"^(?=.*\d)[A-Za-z0-9]+$")
+
+
+def endpoint_label(path: str) -> str:
+    """
+    Returns the endpoint of an API path with IDs replaced, to keep the number of label values low.
+
+    Args:
+        path (str): An API path relative to the API prefix, e.g. "albums/4aawyAB9vmqN3uQ7FjRGTy/tracks".
+
+    Returns:
+        str: The endpoint, e.g. "albums/{id}/tracks".
+    """
+    path = path.split("?")[0].strip("/")
+    return "/".join(
+        "{id}" if ID_SEGMENT.match(segment) else segment for segment in path.split("/")
+    )
+
+
+def escape(label) -> str:
+    return str(label).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """
+    Thread-safe counters and timing spans of a run.
+
+    Spans are aggregated by name and labels into their count, total and maximum duration.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self._counters: dict[tuple, float] = {}
+        self._spans: dict[tuple, tuple[int, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            count, total, longest = self._spans.get(key, (0, 0.0, 0.0))
+            self._spans[key] = (count + 1, total + seconds, max(longest, seconds))
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def report(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            spans = dict(self._spans)
+
+        return {
+            "started_at": self.started_at.isoformat(),
+            "seconds": round(time.perf_counter() - self._start, 3),
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+            "spans": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": count,
+                    "seconds": round(total, 6),
+                    "max_seconds": round(longest, 6),
+                }
+                for (name, labels), (count, total, longest) in sorted(spans.items())
+            ],
+        }
+
+    def to_prometheus(self, job: str) -> str:
+        """
+        Formats the metrics in the Prometheus text exposition format.
+
+        Args:
+            job (str): The name of the job, added as a label to every sample.
+
+        Returns:
+            str: The metrics, e.g. for the textfile collector of the node exporter.
+        """
+        report = self.report()
+        lines = []
+
+        def sample(name: str, labels: dict, value: float):
+            formatted = ",".join(
+                f'{key}="{escape(label)}"'
+                for key, label in {"job": job, **labels}.items()
+            )
+            lines.append(f"{PREFIX}_{name}{{{formatted}}} {value}")
+
+        lines.append(f"# TYPE {PREFIX}_run_seconds gauge")
+        sample("run_seconds", {}, report["seconds"])
+
+        for counter in sorted({counter["name"] for counter in report["counters"]}):
+            lines.append(f"# TYPE {PREFIX}_{counter}_total counter")
+            for entry in report["counters"]:
+                if entry["name"] == counter:
+                    sample(f"{counter}_total", entry["labels"], entry["value"])
+
+        for span in sorted({span["name"] for span in report["spans"]}):
+            lines.append(f"# TYPE {PREFIX}_{span}_seconds summary")
+            for entry in report["spans"]:
+                if entry["name"] == span:
+                    sample(f"{span}_seconds_sum", entry["labels"], entry["seconds"])
+                    sample(f"{span}_seconds_count", entry["labels"], entry["count"])
+            lines.append(f"# TYPE {PREFIX}_{span}_max_seconds gauge")
+            for entry in report["spans"]:
+                if entry["name"] == span:
+                    sample(f"{span}_max_seconds", entry["labels"], entry["max_seconds"])
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, job: str, directory: str = "logs"):
+        """
+        Writes the metrics to <directory>/<job>.prom and <directory>/<job>.metrics.json.
+
+        The files are replaced atomically, so a collector never reads a partial file.
+
+        Args:
+            job (str): The name of the job, as passed to init_job.
+            directory (str): The directory of the files, next to the log files by default.
+        """
+        os.makedirs(directory, exist_ok=True)
+        outputs = {
+            f"{job}.prom": self.to_prometheus(job),
+            f"{job}.metrics.json": json.dumps(
+                {"job": job, **self.report()}, indent=2
+            ),
+        }
+        for name, content in outputs.items():
+            path = os.path.join(directory, name)
+            with open(f"{path}.tmp", "w") as f:
+                f.write(content)
+            os.replace(f"{path}.tmp", path)
+
+
+@lru_cache(maxsize=None)
+def get_metrics() -> Metrics:
+    """
+    Returns the metrics shared by every thread of the process.
+
+    Returns:
+        Metrics: The metrics of the current run.
+    """
+    return Metrics()
+
+
+def timed(name: str):
+    """
+    Returns a decorator recording a span for every call of the decorated function.
+
+    Args:
+        name (str): The name of the span, the function name is added as a label.
+    """
+
+    def decorate(function):
+        @wraps(function)
+        def call(*args, **kwargs):
+            with get_metrics().span(name, function=function.__name__):
+                return function(*args, **kwargs)
+
+        return call
+
+    return decorate
@@ -1,49 +1,53 @@
 # Description: This script gets the last played tracks from the Spotify API and loads them into a BigQuery table.
 import datetime
+import math
+import spotipy
 import pandas as pd
 import os
 import logging
-from load2bq import load2bq
-from dotenv import load_dotenv
+from sinks import get_sink
+from job import init_job
+from mapping import compile_table
+from artists import load_artists
+from audio_features import load_audio_features
+from dimensions import intern_items, load_dimensions, normalise
 from validations import check_if_valid_data, check_if_valid_interval
 from connect_to_spotify import connect2spotify
+from state import load_state, save_state
 
-load_dotenv()
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s :: %(levelname)s :: %(message)s",
-    filename=f"logs/{os.path.basename(__file__).split('.')[0]}.log",
-)
-
-logging.info("The job of getting the played tracks started.")
-
-sp = connect2spotify("user-read-recently-played")
-
-
-def get_played_tracks(time_interval: int) -> pd.DataFrame:
-    results = sp.current_user_recently_played(limit=50, after=time_interval)
-    played_tracks_list = []
-
-    for song in results["items"]:
-        song_row = {
-            "song_name": song["track"]["name"],
-            "song_url": song["track"]["external_urls"]["spotify"],
-            "song_id": song["track"]["id"],
-            "song_release_date": song["track"]["album"]["release_date"],
-            "album_name": song["track"]["album"]["name"],
-            "album_url": song["track"]["album"]["external_urls"]["spotify"],
-            "duration_ms": song["track"]["duration_ms"],
-            "artist_name": song["track"]["album"]["artists"][0]["name"],
-            "artist_profile_url": song["track"]["album"]["artists"][0]["external_urls"][
-                "spotify"
-            ],
-            "artist_id": song["track"]["album"]["artists"][0]["id"],
-            "played_at": song["played_at"],
-            "timestamp_": song["played_at"][:10],
-        }
-        played_tracks_list.append(song_row)
-
-    song_df = pd.DataFrame(played_tracks_list)
+
+def get_played_items(sp: spotipy.Spotify, after: int) -> list[dict]:
+    played_items = []
+
+    while True:
+        results = sp.current_user_recently_played(limit=50, after=after)
+        if not results["items"] or not results["cursors"]:
+            return played_items
+
+        played_items.extend(results["items"])
+        next_after = int(results["cursors"]["after"])
+        # Stop when the cursor does not move forward anymore
+        if next_after <= after:
+            return played_items
+        after = next_after
+
+
+def get_played_tracks(sp: spotipy.Spotify, time_interval: int) -> pd.DataFrame:
+    played_items = get_played_items(sp, time_interval)
+    intern_items("my_played_tracks", played_items)
+    song_df = compile_table("my_played_tracks")(played_items)
+    if song_df.empty:
+        return song_df
+
+    # Parsed once for the filter, the validation and the cursor. The column is not
+    # part of the schema, so it is not loaded.
+    song_df["played_at_utc"] = pd.to_datetime(song_df["played_at"], utc=True)
+    # Plays at or before the cursor were loaded by a previous run
+    song_df = song_df[
+        song_df["played_at_utc"] > pd.Timestamp(time_interval, unit="ms", tz="UTC")
+    ]
+    song_df = song_df.drop_duplicates(subset="played_at")
+    song_df["timestamp_"] = song_df["played_at"].str[:10]
     song_df["timestamp_"] = song_df["timestamp_"].fillna(
         value=pd.to_datetime(datetime.date.today())
     )
@@ -51,14 +55,28 @@ def get_played_tracks(time_interval: int) -> pd.DataFrame:
     return song_df
 
 
-if __name__ == "__main__":
+def get_cursor(current_datetime: datetime.datetime, interval_hour: int) -> int:
+    cursor = load_state("played_tracks_cursor").get("after")
+    if cursor is not None:
+        logging.info("Continuing from the saved cursor %d", cursor)
+        return cursor
+
+    lower_interval = current_datetime - datetime.timedelta(hours=interval_hour)
+    return int(lower_interval.timestamp()) * 1000
+
+
+def main(sp: spotipy.Spotify):
+    logging.info("The job of getting the played tracks started.")
+
     current_datetime = datetime.datetime.now()
-    intrerval_hour = 24
-    lower_interval = current_datetime - datetime.timedelta(hours=intrerval_hour)
-    unix_timestamp = int(lower_interval.timestamp()) * 1000
+    unix_timestamp = get_cursor(current_datetime, 24)
+    # The interval covers everything since the cursor, which may be older than a day
+    intrerval_hour = math.ceil(
+        (current_datetime.timestamp() * 1000 - unix_timestamp) / 3_600_000
+    )
 
     try:
-        my_played_tracks = get_played_tracks(unix_timestamp)
+        my_played_tracks = get_played_tracks(sp, unix_timestamp)
         logging.info(
             "Data successfully extracted from API, proceeding to validation stage"
         )
@@ -66,9 +84,22 @@ if __name__ == "__main__":
         logging.exception("Something went wrong while extracting data from API")
         raise
 
-    timestamps = my_played_tracks["played_at"].tolist()
     if check_if_valid_data(my_played_tracks, "played_at") and check_if_valid_interval(
-        timestamps, current_datetime, intrerval_hour
+        my_played_tracks["played_at_utc"], current_datetime, intrerval_hour
     ):
         logging.info("Data valid, proceeding to load stage")
-        load2bq(my_played_tracks, "my_played_tracks", "WRITE_APPEND")
+        get_sink().load(
+            *normalise(my_played_tracks, "my_played_tracks"), "WRITE_APPEND"
+        )
+
+        played_at = my_played_tracks["played_at_utc"].max()
+        save_state("played_tracks_cursor", {"after": played_at.value // 10**6})
+
+
+if __name__ == "__main__":
+    init_job(os.path.basename(__file__).split(".")[0])
+    sp = connect2spotify("user-read-recently-played")
+    main(sp)
+    load_audio_features(sp)
+    load_artists(sp)
+    load_dimensions()
@@ -1,86 +1,123 @@
 # Description: This script gets the saved tracks from the user's Spotify account and loads them into BigQuery.
+from typing import Iterator
 import spotipy
 import pandas as pd
 import os
 import logging
-from load2bq import load2bq
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from sinks import get_sink
+from changes import load_changes
+from job import init_job
+from mapping import compile_table
+from artists import load_artists
+from audio_features import load_audio_features
+from dimensions import intern_items, load_dimensions, normalise
 from validations import check_if_valid_data
 from connect_to_spotify import connect2spotify
+from pagination import fetch_all_pages, iter_pages, MAX_WORKERS
+from state import load_state, save_state
+from checkpoint import commit, get_checkpoint
+import streaming
 
-load_dotenv()
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s :: %(levelname)s :: %(message)s",
-    filename=f"logs/{os.path.basename(__file__).split('.')[0]}.log",
-)
-logging.info("The job of getting the playlists started.")
+# Local tracks and podcast episodes in a playlist have no ID, album or artists,
+# and very old playlists have no added_at, so only the playlist ID is checked for nulls
+PLAYLIST_TRACK_REQUIRED = ["playlist_id"]
 
-sp = connect2spotify("user-library-read")
 
-
-def get_playlists(sp: spotipy, user_id: str) -> pd.DataFrame:
+def get_playlists(sp: spotipy.Spotify, user_id: str) -> pd.DataFrame:
     playlists = sp.user_playlists(user_id)
     playlist_list = []
 
     while playlists:
-        for playlist in playlists["items"]:
-            playlists_row = {
-                "playlist_id": playlist["id"],
-                "playlist_name": playlist["name"],
-                "playlist_url": playlist["external_urls"]["spotify"],
-                "playlist_owner_id": playlist["owner"]["display_name"],
-                "playlist_owner": playlist["owner"]["external_urls"]["spotify"],
-                "playlist_owner_url": playlist["owner"]["id"],
-                "playlist_owner_type": playlist["owner"]["type"],
-                "is_public": playlist["public"],
-                "total_track": playlist["tracks"]["total"],
-                "playlist_type": playlist["type"],
-            }
-            playlist_list.append(playlists_row)
-
+        playlist_list.extend(playlists["items"])
         playlists = sp.next(playlists) if playlists["next"] else None
-    playlists_df = pd.DataFrame(playlist_list)
 
-    return playlists_df
+    return compile_table("my_playlists")(playlist_list)
+
+
+def get_playlist_track_items(sp: spotipy.Spotify, playlist_id: str) -> list[dict]:
+    return fetch_all_pages(
+        sp.playlist_items,
+        limit=100,
+        playlist_id=playlist_id,
+        additional_types=("track",),
+        checkpoint=get_checkpoint(f"my_playlists_tracks/{playlist_id}"),
+    )
 
 
-def get_playlist_tracks(username: str, playlist_id_list: list) -> pd.DataFrame:
+def get_playlists_items(sp: spotipy.Spotify, playlist_id_list: list) -> list:
+    if os.environ.get("ASYNC_EXTRACTION", "false").lower() == "true":
+        from async_client import fetch_playlists_items
+
+        return fetch_playlists_items(sp, playlist_id_list)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        return list(
+            executor.map(
+                lambda playlist_id: get_playlist_track_items(sp, playlist_id),
+                playlist_id_list,
+            )
+        )
+
+
+def get_playlist_tracks(sp: spotipy.Spotify, playlist_id_list: list) -> pd.DataFrame:
     playlist_tracks_list = []
+    playlist_ids = []
+    playlists_items = get_playlists_items(sp, playlist_id_list)
+
+    for i, playlist_items in zip(playlist_id_list, playlists_items):
+        # Tracks removed from the catalog are returned without a track object
+        items = [item for item in playlist_items if item["track"] is not None]
+        playlist_tracks_list.extend(items)
+        intern_items("my_playlists_tracks", items)
+        playlist_ids.extend([i] * len(items))
+
+    return compile_table("my_playlists_tracks")(
+        playlist_tracks_list, playlist_id=playlist_ids
+    )
+
+
+def iter_playlist_tracks(
+    sp: spotipy.Spotify, playlist_id_list: list
+) -> Iterator[pd.DataFrame]:
+    for playlist_id in playlist_id_list:
+        for items in iter_pages(
+            sp.playlist_items,
+            limit=100,
+            playlist_id=playlist_id,
+            additional_types=("track",),
+        ):
+            items = [item for item in items if item["track"] is not None]
+            intern_items("my_playlists_tracks", items)
+            playlist_tracks_df = compile_table("my_playlists_tracks")(
+                items, playlist_id=playlist_id
+            )
+            playlist_tracks_df["album_release_date"] = playlist_tracks_df[
+                "album_release_date"
+            ].fillna("1900-01-01")
+            yield playlist_tracks_df
 
-    for i in playlist_id_list:
-        results = sp.user_playlist_tracks(username, i)
-        playlist_items = results["items"]
-
-        for item in playlist_items:
-            playlist_tracks_row = {
-                "playlist_id": i,
-                "track_id": item["track"]["id"],
-                "track_name": item["track"]["name"],
-                "artist_id": item["track"]["artists"][0]["id"],
-                "artist_name": item["track"]["artists"][0]["name"],
-                "artist_type": item["track"]["artists"][0]["type"],
-                "album_id": item["track"]["album"]["id"],
-                "album_name": item["track"]["album"]["name"],
-                "album_type": item["track"]["album"]["album_type"],
-                "album_release_date": item["track"]["album"]["release_date"],
-                "album_total_tracks": item["track"]["album"]["total_tracks"],
-                "track_type": item["track"]["type"],
-                "duraiton": item["track"]["duration_ms"],
-                "added_at": item["added_at"],
-                "added_by": item["added_by"]["id"],
-                "is_explicit": item["track"]["explicit"],
-            }
-            playlist_tracks_list.append(playlist_tracks_row)
-
-        while results["next"]:
-            results = sp.next(results)
-            playlist_items.append(results["items"])
-
-    return pd.DataFrame(playlist_tracks_list)
 
+def get_changed_playlists(playlists_df: pd.DataFrame, snapshots: dict) -> list:
+    return [
+        playlist_id
+        for playlist_id, snapshot_id in zip(
+            playlists_df["playlist_id"], playlists_df["snapshot_id"]
+        )
+        if snapshots.get(playlist_id) != snapshot_id
+    ]
+
+
+def save_snapshots(playlists_df: pd.DataFrame):
+    save_state(
+        "playlist_snapshots",
+        dict(zip(playlists_df["playlist_id"], playlists_df["snapshot_id"])),
+    )
+
+
+def load_playlists(sp: spotipy.Spotify) -> pd.DataFrame:
+    logging.info("The job of getting the playlists started.")
 
-if __name__ == "__main__":
     try:
         playlists_df = get_playlists(sp, sp.me()["id"])
         logging.info(
@@ -92,21 +129,88 @@ if __name__ == "__main__":
         )
         raise
 
-    if check_if_valid_data(playlists_df, "playlist_id"):
-        logging.info("Data valid, proceeding to load stage")
-        load2bq(playlists_df, table_id="my_playlists", load_type="WRITE_TRUNCATE")
+    if not check_if_valid_data(playlists_df, "playlist_id"):
+        return pd.DataFrame()
+
+    logging.info("Data valid, proceeding to load stage")
+    load_changes(playlists_df, "my_playlists", ["playlist_id"])
+    return playlists_df
+
+
+def load_playlist_tracks(sp: spotipy.Spotify, playlists_df: pd.DataFrame):
+    if playlists_df.empty:
+        return
+
+    snapshots = load_state("playlist_snapshots")
+    changed_playlists = get_changed_playlists(playlists_df, snapshots)
+    removed_playlists = list(set(snapshots) - set(playlists_df["playlist_id"]))
+    logging.info(
+        "%d of %d playlists changed and %d removed since the last run",
+        len(changed_playlists),
+        len(playlists_df),
+        len(removed_playlists),
+    )
+
+    if not changed_playlists and not removed_playlists:
+        logging.info("No playlist changed, finishing execution")
+        return
+
+    if streaming.is_enabled():
+        replace = ("playlist_id", changed_playlists + removed_playlists)
+        with streaming.ChunkedLoader(
+            "my_playlists_tracks",
+            replace=replace if snapshots else None,
+            required=PLAYLIST_TRACK_REQUIRED,
+        ) as loader:
+            for playlist_tracks_df in iter_playlist_tracks(sp, changed_playlists):
+                loader.write(playlist_tracks_df)
+        save_snapshots(playlists_df)
+        return
 
-        playlist_tracks_df = get_playlist_tracks(
-            sp.me()["id"], playlists_df["playlist_id"].to_list()
+    try:
+        playlist_tracks_df = get_playlist_tracks(sp, changed_playlists)
+        logging.info(
+            "Playlist tracks data successfully extracted from API, proceeding to validation stage"
         )
+    except:
+        logging.exception(
+            "Something went wrong while extracting playlist tracks data from API"
+        )
+        raise
+
+    if not playlist_tracks_df.empty:
         playlist_tracks_df["album_release_date"] = playlist_tracks_df[
             "album_release_date"
         ].fillna("1900-01-01")
+        check_if_valid_data(playlist_tracks_df, required=PLAYLIST_TRACK_REQUIRED)
 
-        if check_if_valid_data(playlist_tracks_df):
-            logging.info("Data valid, proceeding to load stage")
-            load2bq(
-                playlist_tracks_df,
-                table_id="my_playlists_tracks",
-                load_type="WRITE_TRUNCATE",
-            )
+    if not snapshots:
+        logging.info("No saved snapshots, proceeding to full load stage")
+        get_sink().load(
+            *normalise(playlist_tracks_df, "my_playlists_tracks"),
+            load_type="WRITE_TRUNCATE",
+        )
+    else:
+        logging.info("Proceeding to merge changed playlists")
+        get_sink().replace_rows(
+            *normalise(playlist_tracks_df, "my_playlists_tracks"),
+            key="playlist_id",
+            keys=changed_playlists + removed_playlists,
+        )
+
+    commit("my_playlists_tracks")
+    save_snapshots(playlists_df)
+
+
+def main(sp: spotipy.Spotify):
+    playlists_df = load_playlists(sp)
+    load_playlist_tracks(sp, playlists_df)
+
+
+if __name__ == "__main__":
+    init_job(os.path.basename(__file__).split(".")[0])
+    sp = connect2spotify("user-library-read")
+    main(sp)
+    load_audio_features(sp)
+    load_artists(sp)
+    load_dimensions()
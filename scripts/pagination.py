@@ -0,0 +1,150 @@
+# Description: This script contains helpers to page through offset-based Spotify API endpoints.
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
+import logging
+from checkpoint import PageCheckpoint
+from metrics import get_metrics
+
+MAX_WORKERS = 8
+
+
+def fetch_all_pages(
+    fetch_page: Callable[..., dict],
+    limit: int = 50,
+    max_workers: int = MAX_WORKERS,
+    first_page: dict | None = None,
+    checkpoint: PageCheckpoint | None = None,
+    **kwargs,
+) -> list[dict]:
+    """
+    Fetches every item of an offset-based paging endpoint.
+
+    The first page is requested on its own to learn the total number of items,
+    then every remaining offset is requested concurrently on a bounded thread pool.
+
+    With a checkpoint, every fetched page is staged on disk, and pages staged by a
+    previous run are reused instead of fetched again. Staged pages are discarded when
+    the first page or the total changed since, as the offsets would no longer match.
+
+    Args:
+        fetch_page (Callable[..., dict]): Spotipy method accepting limit and offset, e.g. sp.current_user_saved_tracks.
+        limit (int): The number of items to request per page.
+        max_workers (int): The maximum number of pages requested at the same time.
+        first_page (dict | None): An already fetched first page, e.g. the tracks embedded in an album object.
+        checkpoint (PageCheckpoint | None): Where to stage the fetched pages.
+        **kwargs: Extra arguments passed to every fetch_page call.
+
+    Returns:
+        list[dict]: All items, in the order the API returned them.
+    """
+    if first_page is None:
+        first_page = fetch_page(limit=limit, offset=0, **kwargs)
+        get_metrics().inc("pages")
+
+    staged = {}
+    if checkpoint is not None:
+        staged = checkpoint.load()
+        known = staged.get(0)
+        if known is None or (known["total"], known["items"]) != (
+            first_page["total"],
+            first_page["items"],
+        ):
+            if staged:
+                logging.info("Discarding staged pages of %s", checkpoint.name)
+            checkpoint.clear()
+            staged = {}
+            checkpoint.save(0, first_page)
+
+    items = list(first_page["items"])
+    # The first page may hold fewer items than its limit, the next page still starts at the limit
+    offsets = list(range(first_page.get("limit", limit), first_page["total"], limit))
+    missing = [offset for offset in offsets if offset not in staged]
+
+    if not offsets:
+        return items
+
+    logging.info(
+        "Fetching %d more pages for %d items in total, %d pages were staged",
+        len(missing),
+        first_page["total"],
+        len(offsets) - len(missing),
+    )
+
+    def fetch(offset: int) -> dict:
+        page = fetch_page(limit=limit, offset=offset, **kwargs)
+        if checkpoint is not None:
+            checkpoint.save(offset, page)
+        return page
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        fetched = dict(zip(missing, executor.map(fetch, missing)))
+    get_metrics().inc("pages", len(missing))
+
+    for offset in offsets:
+        items.extend((fetched.get(offset) or staged[offset])["items"])
+    return items
+
+
+def iter_pages(
+    fetch_page: Callable[..., dict],
+    limit: int = 50,
+    watermark: str | None = None,
+    **kwargs,
+) -> Iterator[list[dict]]:
+    """
+    Yields the items of an offset-based paging endpoint one page at a time.
+
+    Pages are requested one after another, so only the current page is held in memory.
+
+    Args:
+        fetch_page (Callable[..., dict]): Spotipy method accepting limit and offset, e.g. sp.current_user_saved_tracks.
+        limit (int): The number of items to request per page.
+        watermark (str | None): If given, stops at the first item added at or before it, library endpoints return the newest items first.
+        **kwargs: Extra arguments passed to every fetch_page call.
+
+    Yields:
+        list[dict]: The items of a page, in the order the API returned them.
+    """
+    offset = 0
+
+    while True:
+        page = fetch_page(limit=limit, offset=offset, **kwargs)
+        get_metrics().inc("pages")
+        items = page["items"]
+        if watermark is not None:
+            for i, item in enumerate(items):
+                if item["added_at"] <= watermark:
+                    if i:
+                        yield items[:i]
+                    return
+
+        if items:
+            yield items
+        if page["next"] is None:
+            return
+        offset += limit
+
+
+def fetch_added_since(
+    fetch_page: Callable[..., dict], watermark: str, limit: int = 50, **kwargs
+) -> list[dict]:
+    """
+    Fetches the items added after the given watermark from a library endpoint.
+
+    Library endpoints return the newest items first, so pages are requested one
+    after another until an item at or before the watermark is reached.
+
+    Args:
+        fetch_page (Callable[..., dict]): Spotipy method accepting limit and offset, e.g. sp.current_user_saved_tracks.
+        watermark (str): The newest added_at value already loaded.
+        limit (int): The number of items to request per page.
+        **kwargs: Extra arguments passed to every fetch_page call.
+
+    Returns:
+        list[dict]: The items added after the watermark, newest first.
+    """
+    return [
+        item
+        for page in iter_pages(fetch_page, limit, watermark, **kwargs)
+        for item in page
+    ]
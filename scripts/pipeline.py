@@ -0,0 +1,170 @@
+# Description: This script runs all extraction jobs in one process as a dependency graph of tasks.
+from __future__ import annotations
+import importlib
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from metrics import get_metrics
+
+if TYPE_CHECKING:
+    import spotipy
+
+
+class Task(NamedTuple):
+    """
+    A function of an extraction module, run with the client and the results of its dependencies.
+
+    The module is only imported when the task runs, so selecting a few tasks does
+    not import every extraction module. The results of the dependencies are passed
+    in the order of depends_on, a tuple result as several arguments.
+    """
+
+    name: str
+    module: str
+    function: str
+    depends_on: tuple[str, ...] = ()
+
+
+class TaskStatus(NamedTuple):
+    status: str
+    seconds: float
+
+
+TASKS = [
+    Task("saved_tracks", "current_user_saved_tracks", "main"),
+    Task("saved_episodes", "current_user_saved_episodes", "main"),
+    Task("saved_shows", "current_user_saved_shows", "main"),
+    Task("my_top_tracks", "current_user_top_tracks", "main"),
+    Task("my_played_tracks", "my_played_tracks", "main"),
+    Task("genres", "recommendation_genre_seeds", "main"),
+    Task("my_albums", "current_user_saved_albums", "load_albums"),
+    Task(
+        "album_tracks",
+        "current_user_saved_albums",
+        "load_album_tracks",
+        depends_on=("my_albums",),
+    ),
+    Task("my_playlists", "my_playlists", "load_playlists"),
+    Task(
+        "my_playlists_tracks",
+        "my_playlists",
+        "load_playlist_tracks",
+        depends_on=("my_playlists",),
+    ),
+]
+
+
+def select_tasks(names: list[str]) -> list[Task]:
+    """
+    Returns the tasks with the given names together with all their dependencies.
+
+    Args:
+        names (list[str]): The names of the tasks to run, all tasks if empty.
+
+    Returns:
+        list[Task]: The selected tasks, in the order they are declared.
+    """
+    tasks = {task.name: task for task in TASKS}
+    unknown = set(names) - set(tasks)
+    if unknown:
+        raise ValueError(f"Unknown tasks {unknown}")
+
+    selected = set(names or tasks)
+    stack = list(selected)
+    while stack:
+        for dependency in tasks[stack.pop()].depends_on:
+            if dependency not in selected:
+                selected.add(dependency)
+                stack.append(dependency)
+
+    return [task for task in TASKS if task.name in selected]
+
+
+def run_task(task: Task, sp: spotipy.Spotify, results: dict) -> tuple[Any, float]:
+    logging.info("Task %s started", task.name)
+    start = time.perf_counter()
+    run = getattr(importlib.import_module(task.module), task.function)
+    args = []
+    for dependency in task.depends_on:
+        value = results[dependency]
+        args.extend(value if isinstance(value, tuple) else (value,))
+
+    with get_metrics().span("task", task=task.name):
+        value = run(sp, *args)
+    return value, time.perf_counter() - start
+
+
+def run_pipeline(
+    sp: spotipy.Spotify, tasks: list[Task], max_workers: int
+) -> dict[str, TaskStatus]:
+    """
+    Runs the given tasks, starting every task as soon as all its dependencies succeeded.
+
+    Tasks whose dependencies failed or were skipped are skipped as well.
+
+    Args:
+        sp (spotipy.Spotify): The authenticated Spotify client shared by all tasks.
+        tasks (list[Task]): The tasks to run.
+        max_workers (int): The maximum number of tasks running at the same time.
+
+    Returns:
+        dict[str, TaskStatus]: The status and duration of each task, by task name.
+    """
+    names = {task.name for task in tasks}
+    for task in tasks:
+        unknown = set(task.depends_on) - names
+        if unknown:
+            raise ValueError(f"Task {task.name} depends on unknown tasks {unknown}")
+
+    pending = {task.name: task for task in tasks}
+    running: dict[Future, Task] = {}
+    results = {}
+    statuses: dict[str, TaskStatus] = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            progressed = False
+            for task in list(pending.values()):
+                dependencies = [statuses.get(name) for name in task.depends_on]
+                if any(
+                    status is not None and status.status != "success"
+                    for status in dependencies
+                ):
+                    logging.warning(
+                        "Task %s skipped, a dependency did not succeed", task.name
+                    )
+                    statuses[task.name] = TaskStatus("skipped", 0.0)
+                    del pending[task.name]
+                    progressed = True
+                elif all(status is not None for status in dependencies):
+                    running[executor.submit(run_task, task, sp, results)] = task
+                    del pending[task.name]
+                    progressed = True
+
+            if not running:
+                # Skipped tasks may decide the remaining ones on the next pass
+                if not progressed:
+                    raise ValueError(f"Tasks {list(pending)} have cyclic dependencies")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                try:
+                    results[task.name], seconds = future.result()
+                    statuses[task.name] = TaskStatus("success", seconds)
+                    logging.info("Task %s succeeded in %.1fs", task.name, seconds)
+                except Exception:
+                    logging.exception("Task %s failed", task.name)
+                    statuses[task.name] = TaskStatus("failed", 0.0)
+
+    return statuses
+
+
+def report(statuses: dict[str, TaskStatus]):
+    for name, status in statuses.items():
+        line = f"{name:<22} {status.status:<8} {status.seconds:>7.1f}s"
+        logging.info(line)
+        print(line)
@@ -0,0 +1,183 @@
+# Description: This script contains the rate limiting and retry handling shared by all Spotify API calls.
+import logging
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+
+import requests
+import spotipy
+from urllib3.util.retry import Retry
+
+from metrics import endpoint_label, get_metrics
+
+# Responses worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket whose rate adapts to throttling.
+
+    The rate is halved whenever the API throttles a request and grows back
+    slowly with every successful request, up to max_rate.
+    """
+
+    def __init__(self, rate: float, max_rate: float, min_rate: float = 0.5):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.throttled = 0
+        self._tokens = 1.0
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes a token from the bucket.
+
+        Returns:
+            float: The number of seconds to wait before the request may be sent.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.rate, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            get_metrics().inc("rate_limit_wait_seconds", delay)
+            time.sleep(delay)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + 0.05)
+
+    def on_throttled(self, retry_after: float | None):
+        """
+        Slows down all callers after a 429 response.
+
+        Args:
+            retry_after (float | None): The Retry-After value of the response in seconds, if any.
+        """
+        with self._lock:
+            self.throttled += 1
+            get_metrics().inc("throttled")
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after is not None:
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + retry_after
+                )
+        logging.warning(
+            "Throttled by Spotify API, rate lowered to %.2f requests/s", self.rate
+        )
+
+
+@lru_cache(maxsize=None)
+def get_limiter() -> TokenBucket:
+    """
+    Returns the token bucket shared by every Spotify client in the process.
+
+    Returns:
+        TokenBucket: A bucket starting at SPOTIFY_RATE_LIMIT requests per second.
+    """
+    return TokenBucket(
+        rate=float(os.environ.get("SPOTIFY_RATE_LIMIT", "10")),
+        max_rate=float(os.environ.get("SPOTIFY_MAX_RATE_LIMIT", "50")),
+    )
+
+
+class RateLimitedSpotify(spotipy.Spotify):
+    """
+    A Spotify client sending every request through the shared token bucket.
+
+    Throttled and failed requests and connection errors are retried with jittered
+    exponential backoff, waiting at least as long as the Retry-After header asks for.
+    """
+
+    def __init__(
+        self,
+        *args,
+        limiter: TokenBucket | None = None,
+        max_retries: int = 5,
+        backoff_factor: float = 0.5,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter or get_limiter()
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._session.hooks["response"].append(self._count_response)
+
+    def _build_session(self):
+        # Retries are handled in _internal_call. urllib3 must hand back every response
+        # as is, otherwise spotipy reports exhausted retries as a 429 without headers.
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            max_retries=Retry(
+                total=0, raise_on_status=False, respect_retry_after_header=False
+            )
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def _count_response(self, response, *args, **kwargs):
+        get_metrics().inc("api_response_bytes", len(response.content))
+
+    def _internal_call(self, method, url, payload, params):
+        metrics = get_metrics()
+        endpoint = endpoint_label(url.removeprefix(self.prefix))
+
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                with metrics.span("api_call", endpoint=endpoint):
+                    results = super()._internal_call(method, url, payload, params)
+                metrics.inc("api_calls", endpoint=endpoint, status="ok")
+                self.limiter.on_success()
+                return results
+            except spotipy.SpotifyException as e:
+                metrics.inc("api_calls", endpoint=endpoint, status=e.http_status)
+                if e.http_status not in RETRY_STATUSES or attempt == self.max_retries:
+                    raise
+                metrics.inc("retries", endpoint=endpoint)
+
+                retry_after = (e.headers or {}).get("Retry-After")
+                retry_after = float(retry_after) if retry_after else None
+                delay = random.uniform(0, self.backoff_factor * 2**attempt)
+                if e.http_status == 429:
+                    # The bucket holds back every caller until Retry-After has passed
+                    self.limiter.on_throttled(retry_after)
+                elif retry_after is not None:
+                    delay = max(delay, retry_after)
+
+                logging.warning(
+                    "Request to %s failed with status %d, retry %d of %d",
+                    url,
+                    e.http_status,
+                    attempt + 1,
+                    self.max_retries,
+                )
+                time.sleep(delay)
+            except requests.exceptions.ConnectionError as e:
+                metrics.inc("api_calls", endpoint=endpoint, status="connection_error")
+                if attempt == self.max_retries:
+                    raise
+                metrics.inc("retries", endpoint=endpoint)
+                logging.warning(
+                    "Request to %s failed with %s, retry %d of %d",
+                    url,
+                    e,
+                    attempt + 1,
+                    self.max_retries,
+                )
+                time.sleep(random.uniform(0, self.backoff_factor * 2**attempt))
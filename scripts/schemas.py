@@ -0,0 +1,279 @@
+# Description: This script contains the schemas of the BigQuery tables loaded by the extraction scripts.
+from typing import NamedTuple
+
+
+class Column(NamedTuple):
+    name: str
+    type: str
+    # Dotted path of the value in an API item, e.g. "track.artists.0.id".
+    # Columns without a path are filled by the extraction script.
+    path: str | None = None
+
+
+SCHEMAS = {
+    "saved_tracks": [
+        Column("track_id", "STRING", "track.id"),
+        Column("track_name", "STRING", "track.name"),
+        Column("track_duration", "INTEGER", "track.duration_ms"),
+        Column("explicit", "BOOLEAN", "track.explicit"),
+        Column("track_url", "STRING", "track.external_urls.spotify"),
+        Column("is_local", "BOOLEAN", "track.is_local"),
+        Column("popularity", "INTEGER", "track.popularity"),
+        Column("type", "STRING", "track.type"),
+        Column("track_number", "INTEGER", "track.track_number"),
+        Column("album_type", "STRING", "track.album.type"),
+        Column("album_id", "STRING", "track.album.id"),
+        Column("album_name", "STRING", "track.album.name"),
+        Column("album_release_date", "STRING", "track.album.release_date"),
+        Column("album_total_tracks", "INTEGER", "track.album.total_tracks"),
+        Column("artist_id", "STRING", "track.artists.0.id"),
+        Column("artist_name", "STRING", "track.artists.0.name"),
+        Column("aded_at", "STRING", "added_at"),
+    ],
+    "my_albums": [
+        Column("album_id", "STRING", "album.id"),
+        Column("album_name", "STRING", "album.name"),
+        Column("album_label", "STRING", "album.label"),
+        Column("album_popularity", "INTEGER", "album.popularity"),
+        Column("album_release_date", "STRING", "album.release_date"),
+        Column("album_total_tracks", "INTEGER", "album.total_tracks"),
+        Column("album_url", "STRING", "album.external_urls.spotify"),
+        Column("album_type", "STRING", "album.type"),
+        Column("artist_id", "STRING", "album.artists.0.id"),
+        Column("artist_name", "STRING", "album.artists.0.name"),
+        Column("aded_at", "STRING", "added_at"),
+    ],
+    "album_tracks": [
+        Column("album_id", "STRING"),
+        Column("track_id", "STRING", "id"),
+        Column("track_name", "STRING", "name"),
+        Column("item_type", "STRING", "type"),
+        Column("track_duration", "INTEGER", "duration_ms"),
+        Column("explicit", "BOOLEAN", "explicit"),
+        Column("is_local", "BOOLEAN", "is_local"),
+        Column("track_number", "INTEGER", "track_number"),
+        Column("artist_id", "STRING", "artists.0.id"),
+        Column("artist_name", "STRING", "artists.0.name"),
+    ],
+    "saved_episodes": [
+        Column("episode_id", "STRING", "episode.id"),
+        Column("episode_name", "STRING", "episode.name"),
+        Column("episode_description", "STRING", "episode.description"),
+        Column("episode_duration", "INTEGER", "episode.duration_ms"),
+        Column("explicit", "BOOLEAN", "episode.explicit"),
+        Column("episode_url", "STRING", "episode.external_urls.spotify"),
+        Column("is_externally_hosted", "BOOLEAN", "episode.is_externally_hosted"),
+        Column("is_playable", "BOOLEAN", "episode.is_playable"),
+        Column("language", "STRING", "episode.language"),
+        Column("release_date", "STRING", "episode.release_date"),
+        Column("type", "STRING", "episode.type"),
+        Column("show_description", "STRING", "episode.show.description"),
+        Column("show_explicit", "BOOLEAN", "episode.show.explicit"),
+        Column("show_url", "STRING", "episode.show.external_urls.spotify"),
+        Column("show_id", "STRING", "episode.show.id"),
+        Column("show_name", "STRING", "episode.show.name"),
+        Column("show_publisher", "STRING", "episode.show.publisher"),
+        Column("shwo_total_episodes", "INTEGER", "episode.show.total_episodes"),
+        Column(
+            "show_is_externally_hosted", "BOOLEAN", "episode.show.is_externally_hosted"
+        ),
+        Column("show_media_type", "STRING", "episode.show.media_type"),
+        Column("aded_at", "STRING", "added_at"),
+    ],
+    "saved_shows": [
+        Column("show_id", "STRING", "show.id"),
+        Column("show_name", "STRING", "show.name"),
+        Column("show_description", "STRING", "show.description"),
+        Column("explicit", "BOOLEAN", "show.explicit"),
+        Column("show_url", "STRING", "show.external_urls.spotify"),
+        Column("is_externally_hosted", "BOOLEAN", "show.is_externally_hosted"),
+        Column("language", "STRING", "show.languages.0"),
+        Column("type", "STRING", "show.type"),
+        Column("show_publisher", "STRING", "show.publisher"),
+        Column("shwo_total_episodes", "INTEGER", "show.total_episodes"),
+        Column("show_media_type", "STRING", "show.media_type"),
+        Column("aded_at", "STRING", "added_at"),
+    ],
+    "my_top_tracks": [
+        Column("time_range", "STRING"),
+        # Position of the track in its time range, starting at 1
+        Column("rank", "INTEGER"),
+        Column("track_id", "STRING", "id"),
+        Column("track_name", "STRING", "name"),
+        Column("track_duration", "INTEGER", "duration_ms"),
+        Column("explicit", "BOOLEAN", "explicit"),
+        Column("track_url", "STRING", "external_urls.spotify"),
+        Column("is_local", "BOOLEAN", "is_local"),
+        Column("popularity", "INTEGER", "popularity"),
+        Column("type", "STRING", "type"),
+        Column("track_number", "INTEGER", "track_number"),
+        Column("album_type", "STRING", "album.type"),
+        Column("album_album_type", "STRING", "album.album_type"),
+        Column("album_id", "STRING", "album.id"),
+        Column("album_name", "STRING", "album.name"),
+        Column("album_release_date", "STRING", "album.release_date"),
+        Column("album_total_tracks", "INTEGER", "album.total_tracks"),
+        Column("artist_id", "STRING", "artists.0.id"),
+        Column("artist_name", "STRING", "artists.0.name"),
+    ],
+    # One snapshot of the top tracks per day, with the rank change since the
+    # previous snapshot, null for tracks new to the time range
+    "my_top_tracks_history": [
+        Column("snapshot_date", "STRING"),
+        Column("time_range", "STRING"),
+        Column("track_id", "STRING"),
+        Column("rank", "INTEGER"),
+        Column("previous_rank", "INTEGER"),
+        Column("rank_delta", "INTEGER"),
+    ],
+    "my_played_tracks": [
+        Column("song_name", "STRING", "track.name"),
+        Column("song_url", "STRING", "track.external_urls.spotify"),
+        Column("song_id", "STRING", "track.id"),
+        Column("song_release_date", "STRING", "track.album.release_date"),
+        Column("album_name", "STRING", "track.album.name"),
+        Column("album_url", "STRING", "track.album.external_urls.spotify"),
+        Column("duration_ms", "INTEGER", "track.duration_ms"),
+        Column("artist_name", "STRING", "track.album.artists.0.name"),
+        Column(
+            "artist_profile_url",
+            "STRING",
+            "track.album.artists.0.external_urls.spotify",
+        ),
+        Column("artist_id", "STRING", "track.album.artists.0.id"),
+        Column("played_at", "STRING", "played_at"),
+        Column("timestamp_", "STRING"),
+    ],
+    "my_playlists": [
+        Column("playlist_id", "STRING", "id"),
+        Column("playlist_name", "STRING", "name"),
+        Column("playlist_url", "STRING", "external_urls.spotify"),
+        Column("playlist_owner_id", "STRING", "owner.display_name"),
+        Column("playlist_owner", "STRING", "owner.external_urls.spotify"),
+        Column("playlist_owner_url", "STRING", "owner.id"),
+        Column("playlist_owner_type", "STRING", "owner.type"),
+        Column("is_public", "BOOLEAN", "public"),
+        Column("total_track", "INTEGER", "tracks.total"),
+        Column("playlist_type", "STRING", "type"),
+        Column("snapshot_id", "STRING", "snapshot_id"),
+    ],
+    "my_playlists_tracks": [
+        Column("playlist_id", "STRING"),
+        Column("track_id", "STRING", "track.id"),
+        Column("track_name", "STRING", "track.name"),
+        Column("artist_id", "STRING", "track.artists.0.id"),
+        Column("artist_name", "STRING", "track.artists.0.name"),
+        Column("artist_type", "STRING", "track.artists.0.type"),
+        Column("album_id", "STRING", "track.album.id"),
+        Column("album_name", "STRING", "track.album.name"),
+        Column("album_type", "STRING", "track.album.album_type"),
+        Column("album_release_date", "STRING", "track.album.release_date"),
+        Column("album_total_tracks", "INTEGER", "track.album.total_tracks"),
+        Column("track_type", "STRING", "track.type"),
+        Column("duraiton", "INTEGER", "track.duration_ms"),
+        Column("added_at", "STRING", "added_at"),
+        Column("added_by", "STRING", "added_by.id"),
+        Column("is_explicit", "BOOLEAN", "track.explicit"),
+    ],
+    "genres": [
+        Column("genres", "STRING"),
+    ],
+    "track_audio_features": [
+        Column("track_id", "STRING", "id"),
+        Column("danceability", "FLOAT", "danceability"),
+        Column("energy", "FLOAT", "energy"),
+        Column("key", "INTEGER", "key"),
+        Column("loudness", "FLOAT", "loudness"),
+        Column("mode", "INTEGER", "mode"),
+        Column("speechiness", "FLOAT", "speechiness"),
+        Column("acousticness", "FLOAT", "acousticness"),
+        Column("instrumentalness", "FLOAT", "instrumentalness"),
+        Column("liveness", "FLOAT", "liveness"),
+        Column("valence", "FLOAT", "valence"),
+        Column("tempo", "FLOAT", "tempo"),
+        Column("duration_ms", "INTEGER", "duration_ms"),
+        Column("time_signature", "INTEGER", "time_signature"),
+    ],
+    "artists": [
+        Column("artist_id", "STRING", "id"),
+        Column("artist_name", "STRING", "name"),
+        Column("artist_popularity", "INTEGER", "popularity"),
+        Column("artist_followers", "INTEGER", "followers.total"),
+        Column("artist_url", "STRING", "external_urls.spotify"),
+    ],
+    # Bridge tables, every credited artist of a track and every genre of an artist
+    "track_artists": [
+        Column("track_id", "STRING"),
+        Column("artist_id", "STRING"),
+        Column("artist_position", "INTEGER"),
+    ],
+    "artist_genres": [
+        Column("artist_id", "STRING"),
+        Column("genre", "STRING"),
+    ],
+    # Dimension tables, paths are relative to the artist, album, track or show object
+    "dim_artist": [
+        Column("artist_id", "STRING", "id"),
+        Column("artist_name", "STRING", "name"),
+        Column("artist_type", "STRING", "type"),
+        Column("artist_url", "STRING", "external_urls.spotify"),
+    ],
+    "dim_album": [
+        Column("album_id", "STRING", "id"),
+        Column("album_name", "STRING", "name"),
+        Column("album_type", "STRING", "album_type"),
+        Column("album_label", "STRING", "label"),
+        Column("album_popularity", "INTEGER", "popularity"),
+        Column("album_release_date", "STRING", "release_date"),
+        Column("album_total_tracks", "INTEGER", "total_tracks"),
+        Column("album_url", "STRING", "external_urls.spotify"),
+        Column("artist_id", "STRING", "artists.0.id"),
+    ],
+    "dim_track": [
+        Column("track_id", "STRING", "id"),
+        Column("track_name", "STRING", "name"),
+        Column("track_duration", "INTEGER", "duration_ms"),
+        Column("explicit", "BOOLEAN", "explicit"),
+        Column("is_local", "BOOLEAN", "is_local"),
+        Column("popularity", "INTEGER", "popularity"),
+        Column("track_number", "INTEGER", "track_number"),
+        Column("track_url", "STRING", "external_urls.spotify"),
+        Column("album_id", "STRING", "album.id"),
+        Column("artist_id", "STRING", "artists.0.id"),
+    ],
+    "dim_show": [
+        Column("show_id", "STRING", "id"),
+        Column("show_name", "STRING", "name"),
+        Column("show_description", "STRING", "description"),
+        Column("explicit", "BOOLEAN", "explicit"),
+        Column("show_url", "STRING", "external_urls.spotify"),
+        Column("is_externally_hosted", "BOOLEAN", "is_externally_hosted"),
+        Column("language", "STRING", "languages.0"),
+        Column("show_publisher", "STRING", "publisher"),
+        Column("show_total_episodes", "INTEGER", "total_episodes"),
+        Column("show_media_type", "STRING", "media_type"),
+    ],
+}
+
+# Columns of the narrow fact tables loaded instead of the wide tables when
+# NORMALISED_TABLES is enabled, the rest of a row is kept in the dimension tables
+FACT_COLUMNS = {
+    "saved_tracks": ["track_id", "aded_at"],
+    "my_albums": ["album_id", "aded_at"],
+    "album_tracks": ["album_id", "track_id"],
+    "saved_episodes": [
+        column.name
+        for column in SCHEMAS["saved_episodes"]
+        if not column.path or not column.path.startswith("episode.show.")
+    ]
+    + ["show_id"],
+    "saved_shows": ["show_id", "aded_at"],
+    "my_top_tracks": ["time_range", "rank", "track_id"],
+    "my_played_tracks": ["song_id", "played_at", "timestamp_"],
+    "my_playlists_tracks": ["playlist_id", "track_id", "added_at", "added_by"],
+}
+
+for table_id, names in FACT_COLUMNS.items():
+    SCHEMAS[f"fact_{table_id}"] = [
+        column for column in SCHEMAS[table_id] if column.name in names
+    ]
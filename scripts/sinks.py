@@ -0,0 +1,332 @@
+# Description: This script contains the destinations the extraction scripts load their tables into.
+import os
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from functools import lru_cache
+import pandas as pd
+from load2bq import (
+    apply_schema,
+    get_client,
+    get_table_ref,
+    load2bq,
+    merge2bq,
+    publish2bq,
+)
+from metrics import get_metrics
+from schemas import SCHEMAS
+
+SQLITE_TYPES = {
+    "STRING": "TEXT",
+    "INTEGER": "INTEGER",
+    "FLOAT": "REAL",
+    "BOOLEAN": "INTEGER",
+}
+
+
+def get_staging_id(table_id: str) -> str:
+    # Unique, so concurrent loads never share a staging table
+    return f"{table_id}_staging_{uuid.uuid4().hex}"
+
+
+class Sink(ABC):
+    """
+    A destination of the extracted tables.
+
+    load_type is one of the BigQuery write dispositions "WRITE_TRUNCATE" and
+    "WRITE_APPEND", every sink supports both. Sinks implement _load, _merge, _stage,
+    _publish and _drop, the public methods record the load metrics.
+    """
+
+    name = "sink"
+
+    @property
+    @abstractmethod
+    def destination(self) -> str:
+        """
+        Identifies where the sink writes to, e.g. the database or dataset.
+        """
+
+    def load(
+        self, data: pd.DataFrame, table_id: str, load_type: str = "WRITE_TRUNCATE"
+    ):
+        with get_metrics().span("load", sink=self.name, table=table_id):
+            self._load(data, table_id, load_type)
+        self._count(data, table_id)
+
+    def replace_rows(self, data: pd.DataFrame, table_id: str, key: str, keys: list):
+        """
+        Replaces the rows whose key is in keys with data.
+
+        The rows are staged first and replaced in one step, so readers never see the
+        rows deleted but not yet appended, and a failed load leaves the table unchanged.
+
+        Args:
+            data (pd.DataFrame): The new rows.
+            table_id (str): The table to update.
+            key (str): The column identifying the rows to replace, e.g. "playlist_id".
+            keys (list): The key values whose rows are replaced.
+        """
+        staging_id = get_staging_id(table_id)
+        try:
+            self.stage(data, table_id, staging_id)
+            self.publish(staging_id, table_id, replace=(key, keys))
+        except:
+            self.drop(staging_id)
+            raise
+
+    def merge(
+        self, data: pd.DataFrame, table_id: str, keys: list[str], deleted: pd.DataFrame
+    ):
+        """
+        Inserts or updates the rows of data by their keys, and deletes the deleted rows.
+
+        Args:
+            data (pd.DataFrame): The inserted and updated rows.
+            table_id (str): The table to update, it must exist.
+            keys (list[str]): The primary key columns of the table.
+            deleted (pd.DataFrame): The key columns of the deleted rows.
+        """
+        with get_metrics().span("load", sink=self.name, table=table_id):
+            self._merge(data, table_id, keys, deleted)
+        self._count(data, table_id)
+
+    def stage(self, data: pd.DataFrame, table_id: str, staging_id: str):
+        """
+        Appends data to a staging table, created with the schema of table_id.
+
+        Args:
+            data (pd.DataFrame): The rows to stage.
+            table_id (str): The table the rows are published to later.
+            staging_id (str): The staging table.
+        """
+        with get_metrics().span("load", sink=self.name, table=table_id):
+            self._stage(data, table_id, staging_id)
+        self._count(data, table_id)
+
+    def publish(
+        self,
+        staging_id: str,
+        table_id: str,
+        load_type: str = "WRITE_TRUNCATE",
+        replace: tuple[str, list] | None = None,
+        keys: tuple[str, ...] = (),
+    ):
+        """
+        Moves the rows of a staging table into table_id in one step and drops the staging table.
+
+        Args:
+            staging_id (str): The staging table.
+            table_id (str): The table to update.
+            load_type (str): How the rows are loaded, unless replace is given.
+            replace (tuple[str, list] | None): A key column and the key values whose rows
+                are replaced by the staged rows, as in replace_rows.
+            keys (tuple[str, ...]): The primary key columns, checked for duplicates first.
+        """
+        with get_metrics().span("load", sink=self.name, table=table_id):
+            self._publish(staging_id, table_id, load_type, replace, keys)
+
+    def drop(self, staging_id: str):
+        self._drop(staging_id)
+
+    def _count(self, data: pd.DataFrame, table_id: str):
+        metrics = get_metrics()
+        metrics.inc("rows_loaded", len(data), table=table_id)
+        metrics.inc(
+            "bytes_loaded", int(data.memory_usage(deep=True).sum()), table=table_id
+        )
+
+    @abstractmethod
+    def _load(self, data: pd.DataFrame, table_id: str, load_type: str): ...
+
+    @abstractmethod
+    def _merge(
+        self, data: pd.DataFrame, table_id: str, keys: list[str], deleted: pd.DataFrame
+    ): ...
+
+    @abstractmethod
+    def _stage(self, data: pd.DataFrame, table_id: str, staging_id: str): ...
+
+    @abstractmethod
+    def _publish(
+        self,
+        staging_id: str,
+        table_id: str,
+        load_type: str,
+        replace: tuple[str, list] | None,
+        keys: tuple[str, ...],
+    ): ...
+
+    @abstractmethod
+    def _drop(self, staging_id: str): ...
+
+
+class BigQuerySink(Sink):
+    name = "bigquery"
+
+    @property
+    def destination(self) -> str:
+        return f"{os.environ['GCP_PROJECT_ID']}.{os.environ['dataset_id']}"
+
+    def _load(self, data: pd.DataFrame, table_id: str, load_type: str):
+        load2bq(data, table_id, load_type)
+
+    def _merge(
+        self, data: pd.DataFrame, table_id: str, keys: list[str], deleted: pd.DataFrame
+    ):
+        merge2bq(data, table_id, keys, deleted)
+
+    def _stage(self, data: pd.DataFrame, table_id: str, staging_id: str):
+        load2bq(data, table_id, "WRITE_APPEND", destination=staging_id)
+
+    def _publish(
+        self,
+        staging_id: str,
+        table_id: str,
+        load_type: str,
+        replace: tuple[str, list] | None,
+        keys: tuple[str, ...],
+    ):
+        publish2bq(staging_id, table_id, load_type, replace, keys)
+
+    def _drop(self, staging_id: str):
+        get_client().delete_table(get_table_ref(staging_id), not_found_ok=True)
+
+
+class SQLiteSink(Sink):
+    """
+    A sink writing the tables into a local SQLite database, for offline runs and tests.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+
+    @property
+    def destination(self) -> str:
+        return os.path.abspath(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def _create_table(
+        self, connection: sqlite3.Connection, table_id: str, name: str | None = None
+    ):
+        columns = ", ".join(
+            f'"{column.name}" {SQLITE_TYPES[column.type]}'
+            for column in SCHEMAS[table_id]
+        )
+        connection.execute(
+            f'CREATE TABLE IF NOT EXISTS "{name or table_id}" ({columns})'
+        )
+
+    def _append(
+        self,
+        connection: sqlite3.Connection,
+        data: pd.DataFrame,
+        table_id: str,
+        name: str | None = None,
+    ):
+        data = apply_schema(data, table_id)
+        connection.executemany(
+            f'INSERT INTO "{name or table_id}" '
+            f'VALUES ({", ".join("?" * data.shape[1])})',
+            (
+                [None if pd.isna(value) else value for value in row]
+                for row in data.astype(object).itertuples(index=False)
+            ),
+        )
+
+    def _load(self, data: pd.DataFrame, table_id: str, load_type: str):
+        with self._lock, self._connect() as connection:
+            if load_type == "WRITE_TRUNCATE":
+                connection.execute(f'DROP TABLE IF EXISTS "{table_id}"')
+            self._create_table(connection, table_id)
+            self._append(connection, data, table_id)
+        connection.close()
+        print(f"Loaded {len(data)} rows to {self.path}:{table_id}")
+
+    def _merge(
+        self, data: pd.DataFrame, table_id: str, keys: list[str], deleted: pd.DataFrame
+    ):
+        condition = " AND ".join(f'"{key}" = ?' for key in keys)
+        replaced = pd.concat([data[keys], deleted[keys]]).astype(object)
+        with self._lock, self._connect() as connection:
+            self._create_table(connection, table_id)
+            connection.executemany(
+                f'DELETE FROM "{table_id}" WHERE {condition}',
+                replaced.itertuples(index=False, name=None),
+            )
+            self._append(connection, data, table_id)
+        connection.close()
+        print(
+            f"Merged {len(data)} changed and {len(deleted)} deleted rows "
+            f"into {self.path}:{table_id}"
+        )
+
+    def _stage(self, data: pd.DataFrame, table_id: str, staging_id: str):
+        with self._lock, self._connect() as connection:
+            self._create_table(connection, table_id, staging_id)
+            self._append(connection, data, table_id, staging_id)
+        connection.close()
+
+    def _publish(
+        self,
+        staging_id: str,
+        table_id: str,
+        load_type: str,
+        replace: tuple[str, list] | None,
+        keys: tuple[str, ...],
+    ):
+        with self._lock, self._connect() as connection:
+            if keys:
+                columns = ", ".join(f'"{key}"' for key in keys)
+                duplicate = connection.execute(
+                    f'SELECT 1 FROM "{staging_id}" GROUP BY {columns} '
+                    "HAVING COUNT(*) > 1 LIMIT 1"
+                ).fetchone()
+                if duplicate is not None:
+                    raise ValueError("Primary Key check is violated")
+
+            # One transaction, so readers see either the old or the new rows
+            connection.execute("BEGIN")
+            if replace is None and load_type == "WRITE_TRUNCATE":
+                connection.execute(f'DROP TABLE IF EXISTS "{table_id}"')
+            self._create_table(connection, table_id)
+            if replace is not None:
+                key, values = replace
+                connection.executemany(
+                    f'DELETE FROM "{table_id}" WHERE "{key}" = ?',
+                    [(value,) for value in values],
+                )
+            connection.execute(f'INSERT INTO "{table_id}" SELECT * FROM "{staging_id}"')
+            connection.execute(f'DROP TABLE "{staging_id}"')
+        connection.close()
+        print(f"Published {staging_id} to {self.path}:{table_id}")
+
+    def _drop(self, staging_id: str):
+        with self._lock, self._connect() as connection:
+            connection.execute(f'DROP TABLE IF EXISTS "{staging_id}"')
+        connection.close()
+
+
+@lru_cache(maxsize=None)
+def get_sink() -> Sink:
+    """
+    Returns the sink shared by every extraction in the process.
+
+    Returns:
+        Sink: A BigQuerySink, or a SQLiteSink writing to SINK_PATH if SINK is "sqlite".
+    """
+    sink = os.environ.get("SINK", "bigquery").lower()
+    if sink == "bigquery":
+        return BigQuerySink()
+    if sink == "sqlite":
+        return SQLiteSink(os.environ.get("SINK_PATH", "output/spotify.sqlite"))
+    raise ValueError(f"Unknown sink {sink}")
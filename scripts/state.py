@@ -0,0 +1,165 @@
+# Description: This script contains functions to persist the state of incremental jobs between runs.
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import dimensions
+from sinks import get_sink
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl, e.g. on Windows, the state is only locked within the process
+    fcntl = None
+
+# Jobs running at the same time, e.g. in the pipeline, update the same state files
+_lock = threading.Lock()
+
+
+def get_state_dir() -> str:
+    """
+    Returns the directory of the incremental state of the current sink and destination.
+
+    The state records what was loaded where, so every sink, destination and table
+    layout keeps its own state below STATE_DIR. A run into an empty database or with
+    NORMALISED_TABLES switched starts with a full load and leaves the others untouched.
+
+    Returns:
+        str: The state directory, e.g. state/bigquery-<destination hash>-wide.
+    """
+    sink = get_sink()
+    destination = hashlib.sha256(sink.destination.encode()).hexdigest()[:16]
+    layout = "normalised" if dimensions.is_enabled() else "wide"
+    return os.path.join(
+        os.environ.get("STATE_DIR", "state"), f"{sink.name}-{destination}-{layout}"
+    )
+
+
+@contextmanager
+def locked_state(name: str):
+    """
+    Locks the state saved under the given name against other threads and processes.
+
+    Hold the lock around loading, modifying and saving a state shared by several jobs,
+    so no job overwrites the changes of another.
+
+    Args:
+        name (str): The name of the state, e.g. "watermarks".
+    """
+    os.makedirs(get_state_dir(), exist_ok=True)
+    with _lock, open(os.path.join(get_state_dir(), f"{name}.lock"), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def load_state(name: str) -> dict:
+    """
+    Loads the state saved under the given name.
+
+    Loading does not lock the state, use locked_state to update a shared state.
+
+    Args:
+        name (str): The name of the state, e.g. "playlist_snapshots".
+
+    Returns:
+        dict: The saved state, or an empty dict if nothing was saved yet.
+    """
+    path = os.path.join(get_state_dir(), f"{name}.json")
+    if not os.path.exists(path):
+        logging.info("No saved state found for %s", name)
+        return {}
+
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(name: str, state: dict):
+    """
+    Saves the given state under the given name.
+
+    The state is written to a unique temporary file first and then moved into place,
+    so an interrupted run never leaves a half written state behind.
+
+    Args:
+        name (str): The name of the state, e.g. "playlist_snapshots".
+        state (dict): The JSON serializable state to save.
+    """
+    os.makedirs(get_state_dir(), exist_ok=True)
+    path = os.path.join(get_state_dir(), f"{name}.json")
+    fd, tmp_path = tempfile.mkstemp(
+        dir=get_state_dir(), prefix=f"{name}.", suffix=".tmp"
+    )
+
+    try:
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, path)
+    except:
+        os.remove(tmp_path)
+        raise
+    logging.info("State saved for %s", name)
+
+
+def load_watermark(table_id: str) -> str | None:
+    """
+    Returns the high-water mark to sync the given table incrementally from.
+
+    None is returned when incremental sync is disabled, when the table was never
+    synced, or when the last full sync is older than FULL_RECONCILE_DAYS. In these
+    cases the caller should run a full sync, which also catches removed items.
+
+    Args:
+        table_id (str): The table the watermark belongs to.
+
+    Returns:
+        str | None: The newest added_at value already loaded, or None for a full sync.
+    """
+    if os.environ.get("INCREMENTAL_SYNC", "false").lower() != "true":
+        return None
+
+    watermark = load_state("watermarks").get(table_id)
+    if watermark is None:
+        logging.info("No watermark found for %s, running a full sync", table_id)
+        return None
+
+    full_reconcile_days = int(os.environ.get("FULL_RECONCILE_DAYS", "7"))
+    last_full_sync = datetime.fromisoformat(watermark["last_full_sync"])
+    if datetime.now(timezone.utc) - last_full_sync > timedelta(
+        days=full_reconcile_days
+    ):
+        logging.info("Last full sync of %s is too old, running a full sync", table_id)
+        return None
+
+    logging.info("Syncing %s incrementally from %s", table_id, watermark["added_at"])
+    return watermark["added_at"]
+
+
+def save_watermark(table_id: str, added_at: str, full_sync: bool):
+    """
+    Saves the high-water mark of the given table after a successful load.
+
+    The watermarks of all tables share one state, so it is locked while it is updated.
+
+    Args:
+        table_id (str): The table the watermark belongs to.
+        added_at (str): The newest added_at value loaded into the table.
+        full_sync (bool): Whether the load was a full sync.
+    """
+    with locked_state("watermarks"):
+        watermarks = load_state("watermarks")
+        watermark = watermarks.get(table_id, {})
+        watermark["added_at"] = added_at
+        if full_sync or "last_full_sync" not in watermark:
+            watermark["last_full_sync"] = datetime.now(timezone.utc).isoformat()
+
+        watermarks[table_id] = watermark
+        save_state("watermarks", watermarks)
@@ -0,0 +1,127 @@
+# Description: This script contains the chunked loader used to stream large tables into the sink page by page.
+import logging
+import os
+import pandas as pd
+from dimensions import normalise
+from metrics import get_metrics
+from schemas import SCHEMAS
+from sinks import get_sink, get_staging_id
+from validations import check_if_valid_data
+
+
+def is_enabled() -> bool:
+    return os.environ.get("STREAMING_EXTRACTION", "false").lower() == "true"
+
+
+class ChunkedLoader:
+    """
+    Loads a table into the sink in chunks, as the pages of the table are written to it.
+
+    Pages are buffered until the buffer holds max_rows rows or max_bytes bytes, then the
+    buffer is validated and flushed. At most one chunk and one page are held in memory.
+    Chunks are appended to a staging table, and the table is only changed once every
+    chunk was written: the staged rows are loaded with load_type, or replace the rows
+    of the given keys, in one step. Primary keys are checked within every chunk and
+    across chunks in the staging table, and the required columns are passed to
+    check_if_valid_data.
+
+    Use it as a context manager, the staged rows are published on a clean exit only
+    and dropped otherwise.
+    """
+
+    def __init__(
+        self,
+        table_id: str,
+        load_type: str = "WRITE_TRUNCATE",
+        keys: tuple[str, ...] = (),
+        replace: tuple[str, list] | None = None,
+        required: list[str] | None = None,
+        max_rows: int | None = None,
+        max_bytes: int | None = None,
+    ):
+        self.table_id = table_id
+        self.load_type = load_type
+        self.keys = keys
+        self.replace = replace
+        self.required = required
+        self.max_rows = max_rows or int(os.environ.get("STREAM_CHUNK_ROWS", "10000"))
+        self.max_bytes = max_bytes or int(
+            os.environ.get("STREAM_CHUNK_BYTES", str(64 * 2**20))
+        )
+        self.rows = 0
+        self.chunks = 0
+        self._buffer: list[pd.DataFrame] = []
+        self._buffered_rows = 0
+        self._buffered_bytes = 0
+        self._target: str | None = None
+        self._staging: str | None = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        elif self._staging is not None:
+            get_sink().drop(self._staging)
+
+    def write(self, frame: pd.DataFrame):
+        if frame.empty:
+            return
+        self._buffer.append(frame)
+        self._buffered_rows += len(frame)
+        self._buffered_bytes += int(frame.memory_usage(deep=True).sum())
+        if (
+            self._buffered_rows >= self.max_rows
+            or self._buffered_bytes >= self.max_bytes
+        ):
+            self.flush()
+
+    def _stage(self, chunk: pd.DataFrame):
+        data, self._target = normalise(chunk, self.table_id)
+        if self._staging is None:
+            self._staging = get_staging_id(self._target)
+        get_sink().stage(data, self._target, self._staging)
+        self.chunks += 1
+
+    def flush(self):
+        if not self._buffer:
+            return
+
+        chunk = pd.concat(self._buffer, ignore_index=True)
+        self._buffer = []
+        self._buffered_rows = 0
+        self._buffered_bytes = 0
+
+        check_if_valid_data(chunk, *self.keys, required=self.required)
+        self._stage(chunk)
+        self.rows += len(chunk)
+        get_metrics().inc("chunks", table=self.table_id)
+        logging.info(
+            "Staged chunk %d of %d rows for %s", self.chunks, len(chunk), self.table_id
+        )
+
+    def close(self):
+        try:
+            self.flush()
+            if self._staging is not None:
+                get_sink().publish(
+                    self._staging, self._target, self.load_type, self.replace, self.keys
+                )
+        except:
+            if self._staging is not None:
+                get_sink().drop(self._staging)
+            raise
+
+        if self.chunks == 0 and self.replace is not None:
+            # Rows of the replaced keys are deleted even if no new rows were written
+            columns = [column.name for column in SCHEMAS[self.table_id]]
+            key, keys = self.replace
+            get_sink().replace_rows(
+                *normalise(pd.DataFrame(columns=columns), self.table_id),
+                key=key,
+                keys=keys,
+            )
+        logging.info(
+            "Loaded %d rows to %s in %d chunks", self.rows, self.table_id, self.chunks
+        )
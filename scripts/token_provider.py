@@ -0,0 +1,200 @@
+# Description: This script contains the OAuth token provider shared by every Spotify client, refreshing the token in the background.
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+import spotipy
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl, e.g. on Windows, the token cache is only locked within the process
+    fcntl = None
+
+
+def is_covering(scope: str, granted: str | None) -> bool:
+    return set(scope.split()) <= set((granted or "").split())
+
+
+class TokenProvider:
+    """
+    An auth manager for spotipy clients, sharing one OAuth token between threads and processes.
+
+    The token is cached in a file locked while it is read and refreshed, so only one
+    of several jobs starting together refreshes it and the others take it over.
+    A background thread refreshes the token refresh_margin seconds before it expires,
+    so requests only wait for a refresh if the token expired anyway.
+
+    Without a cached token, the refresh token in SPOTIFY_REFRESH_TOKEN is used if set,
+    for servers without a browser. Otherwise the authorization code flow is started.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        redirect_uri: str,
+        scope: str,
+        cache_path: str,
+        refresh_token: str | None = None,
+        refresh_margin: float = 300,
+    ):
+        self.scope = scope
+        self.cache_path = cache_path
+        self.refresh_margin = refresh_margin
+        self._refresh_token = refresh_token
+        # The token cache is written by the provider only, spotipy keeps its token in memory
+        self._oauth = spotipy.oauth2.SpotifyOAuth(
+            client_id=client_id,
+            client_secret=client_secret,
+            redirect_uri=redirect_uri,
+            scope=scope,
+            cache_handler=spotipy.cache_handler.MemoryCacheHandler(),
+        )
+        self._token = None
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        with open(f"{self.cache_path}.lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_cache(self) -> dict | None:
+        if not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            logging.warning("Ignoring the unreadable token cache %s", self.cache_path)
+            return None
+
+    def _write_cache(self, token: dict):
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(
+            os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600),
+            "w",
+            encoding="utf-8",
+        ) as f:
+            json.dump(token, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _expires_in(self, token: dict | None) -> float:
+        return token["expires_at"] - time.time() if token else float("-inf")
+
+    def _refresh(self) -> dict:
+        """
+        Returns a token valid for at least refresh_margin seconds, refreshing it if needed.
+
+        The token cache is locked meanwhile. A token refreshed by another process
+        since it was last read is taken over instead of refreshed again.
+
+        Returns:
+            dict: The token, as returned by the Spotify accounts service.
+        """
+        with self._lock, self._file_lock():
+            token = self._read_cache()
+            if token is not None and not is_covering(self.scope, token.get("scope")):
+                # A refresh token only grants the scopes it was issued for, so the
+                # cached token and its refresh token are dropped
+                if self._refresh_token is None:
+                    logging.info("The cached token misses scopes, authorizing again")
+                else:
+                    logging.info(
+                        "The cached token misses scopes, refreshing SPOTIFY_REFRESH_TOKEN"
+                    )
+                token = None
+
+            if token is not None and self._expires_in(token) > self.refresh_margin:
+                self._token = token
+                return token
+
+            refresh_token = (token or {}).get("refresh_token") or self._refresh_token
+            if refresh_token is not None:
+                start = time.perf_counter()
+                token = self._oauth.refresh_access_token(refresh_token)
+                logging.info(
+                    "Refreshed the Spotify token in %.2fs", time.perf_counter() - start
+                )
+            else:
+                code = self._oauth.get_auth_response()
+                self._oauth.get_access_token(code, as_dict=False, check_cache=False)
+                token = self._oauth.cache_handler.get_cached_token()
+                logging.info("Authorized a new Spotify token")
+
+            self._write_cache(token)
+            self._token = token
+            return token
+
+    def _refresh_in_background(self):
+        while True:
+            wait = self._expires_in(self._token) - self.refresh_margin
+            time.sleep(max(wait, 1.0))
+            try:
+                self._refresh()
+            except Exception as e:
+                # The current token is still valid, so the refresh is retried later
+                logging.warning("Failed to refresh the Spotify token: %s", e)
+                time.sleep(30)
+
+    def get_access_token(self, as_dict: bool = False) -> str | dict:
+        """
+        Returns the current access token, called by spotipy before every request.
+
+        Args:
+            as_dict (bool): Whether to return the whole token instead of the access token.
+
+        Returns:
+            str | dict: The access token, or the token as a dict.
+        """
+        token = self._token
+        if self._expires_in(token) <= 0:
+            token = self._refresh()
+
+        if self._refresher is None:
+            with self._lock:
+                if self._refresher is None:
+                    self._refresher = threading.Thread(
+                        target=self._refresh_in_background,
+                        name="spotify-token-refresh",
+                        daemon=True,
+                    )
+                    self._refresher.start()
+
+        return token if as_dict else token["access_token"]
+
+
+@lru_cache(maxsize=None)
+def get_token_provider(scope: str) -> TokenProvider:
+    """
+    Returns the token provider of the given scope shared by every client in the process.
+
+    Args:
+        scope (str): The scope of the Spotify API access.
+
+    Returns:
+        TokenProvider: The token provider, configured from the environment.
+    """
+    return TokenProvider(
+        client_id=os.environ.get("SPOTIFY_CLIENT_ID"),
+        client_secret=os.environ.get("SPOTIFY_CLIENT_SECRET"),
+        redirect_uri=os.environ.get(
+            "SPOTIFY_REDIRECT_URI", "http://localhost:7777/callback"
+        ),
+        scope=scope,
+        cache_path=os.environ.get("SPOTIFY_TOKEN_CACHE_PATH", ".cache"),
+        refresh_token=os.environ.get("SPOTIFY_REFRESH_TOKEN"),
+        refresh_margin=float(os.environ.get("SPOTIFY_TOKEN_REFRESH_MARGIN", "300")),
+    )
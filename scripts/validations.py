@@ -1,21 +1,24 @@
 # Description: This script contains functions to validate the data and timestamps.
 import pandas as pd
 import logging
-import pytz
-from dateutil import parser
-from datetime import datetime
+from datetime import datetime, timezone
+from metrics import timed
 
 
-def check_if_valid_data(df: pd.DataFrame, *keys: str) -> bool:
+@timed("validate")
+def check_if_valid_data(
+    df: pd.DataFrame, *keys: str, required: list[str] | None = None
+) -> bool:
     """
     Validates the given DataFrame based on the following checks:
     1. DataFrame is not empty.
     2. Primary key(s) are unique.
-    3. No null values in the DataFrame.
+    3. No null values in the required columns.
 
     Args:
         df (pd.DataFrame): DataFrame to validate.
         keys (str): Column names to be used as primary keys.
+        required (list[str] | None): The columns that must not be null, all columns if None.
 
     Returns:
         bool: True if all checks pass, False otherwise.
@@ -31,42 +34,47 @@ def check_if_valid_data(df: pd.DataFrame, *keys: str) -> bool:
         raise ValueError("Primary Key check is violated")
 
     # Check for nulls
-    if df.isnull().values.any():
+    checked = df if required is None else df[required]
+    if checked.isnull().values.any():
         logging.exception("Null values found in DataFrame")
         raise ValueError("Null values found")
 
     return True
 
 
+@timed("validate")
 def check_if_valid_interval(
-    timestamps: list[str], current_datetime: datetime, interval_hour: int
+    timestamps: pd.Series | list[str], current_datetime: datetime, interval_hour: int
 ) -> bool:
     """
     Validates if all timestamps are within the specified interval.
 
+    The timestamps are parsed at once and compared in UTC, so the check also holds
+    for intervals longer than a day.
+
     Args:
-        timestamps (list[str]): List of timestamp strings to validate.
-        current_datetime (datetime): The current datetime for comparison.
+        timestamps (pd.Series | list[str]): Timestamp strings to validate.
+        current_datetime (datetime): The current datetime for comparison, naive datetimes are taken as local time.
         interval_hour (int): The interval in hours.
 
     Returns:
         bool: True if all timestamps are within the interval, False otherwise.
     """
-    # Check that all timestamps are in the interval
-    for ts in timestamps:
-        # Parse the timestamp and convert to the specified timezone
-        ts = parser.parse(ts).astimezone(pytz.timezone("Europe/Istanbul"))
-        ts = ts.replace(tzinfo=None)
+    timestamps = pd.to_datetime(pd.Series(timestamps), utc=True)
+    current_datetime = pd.Timestamp(current_datetime.astimezone(timezone.utc))
 
-        # Calculate the difference in hours
-        diff = int((current_datetime - ts).seconds // 3600)
+    # Check that all timestamps are in the interval
+    outside_interval = (current_datetime - timestamps) > pd.Timedelta(
+        hours=interval_hour
+    )
 
-        # If the difference is greater than the interval, log and raise an exception
-        if diff > interval_hour:
-            logging.exception(
-                "At least one of the returned songs is not within the interval of %d hours",
-                interval_hour,
-            )
-            raise ValueError("Timestamp not within the valid interval")
+    if outside_interval.any():
+        logging.error(
+            "%d of the returned songs are not within the interval of %d hours: %s",
+            outside_interval.sum(),
+            interval_hour,
+            timestamps[outside_interval].tolist(),
+        )
+        raise ValueError("Timestamp not within the valid interval")
 
     return True
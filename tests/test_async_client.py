@@ -0,0 +1,147 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import spotipy
+
+from async_client import AsyncSpotify
+from rate_limit import TokenBucket
+
+TOTAL = 120
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Statuses and headers of the responses sent before the first 200,
+    # a status of None closes the connection without a response
+    failures: list[tuple[int | None, dict]] = []
+    requests: list[tuple[float, dict]] = []
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.requests.append((time.monotonic(), query))
+        status, headers = self.failures.pop(0) if self.failures else (200, {})
+        if status is None:
+            self.close_connection = True
+            return
+
+        if status != 200:
+            body = {"error": {"status": status}}
+        elif url.path == "/v1/me/tracks":
+            body = self.page(int(query["offset"]), int(query["limit"]))
+        else:
+            body = {"id": "stub-user"}
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def page(self, offset: int, limit: int) -> dict:
+        # The first page is short, as the API sometimes returns
+        size = limit // 2 if offset == 0 else limit
+        return {
+            "items": [{"id": i} for i in range(offset, min(offset + size, TOTAL))],
+            "limit": limit,
+            "offset": offset,
+            "total": TOTAL,
+        }
+
+    def log_message(self, *args):
+        pass
+
+
+class StubAuth:
+    def _auth_headers(self) -> dict:
+        return {"Authorization": "Bearer stub-token"}
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubHandler.requests = []
+    yield server, StubHandler
+    server.shutdown()
+    server.server_close()
+
+
+def run(server, limiter: TokenBucket, call):
+    async def main():
+        async with AsyncSpotify(
+            StubAuth(),
+            base_url=f"http://127.0.0.1:{server.server_port}/v1/",
+            limiter=limiter,
+            backoff_factor=0.01,
+        ) as client:
+            return await call(client)
+
+    return asyncio.run(main())
+
+
+def test_retry_after_is_honoured(stub):
+    server, handler = stub
+    handler.failures = [(429, {"Retry-After": "1"})]
+    limiter = TokenBucket(rate=100, max_rate=100)
+
+    assert run(server, limiter, lambda client: client.get("me")) == {"id": "stub-user"}
+
+    (first, _), (second, _) = handler.requests
+    assert second - first >= 0.9
+    assert limiter.throttled == 1
+
+
+def test_server_errors_are_retried(stub):
+    server, handler = stub
+    handler.failures = [(500, {}), (502, {})]
+    limiter = TokenBucket(rate=100, max_rate=100)
+
+    assert run(server, limiter, lambda client: client.get("me")) == {"id": "stub-user"}
+
+    assert len(handler.requests) == 3
+    assert limiter.throttled == 0
+
+
+def test_client_errors_are_not_retried(stub):
+    server, handler = stub
+    handler.failures = [(404, {})]
+
+    with pytest.raises(spotipy.SpotifyException) as error:
+        run(server, TokenBucket(rate=100, max_rate=100), lambda c: c.get("me"))
+
+    assert error.value.http_status == 404
+    assert len(handler.requests) == 1
+
+
+def test_dropped_connections_are_retried(stub):
+    server, handler = stub
+    handler.failures = [(None, {})]
+
+    me = run(server, TokenBucket(rate=100, max_rate=100), lambda c: c.get("me"))
+
+    assert me == {"id": "stub-user"}
+
+    assert len(handler.requests) == 2
+
+
+def test_fetch_all_pages_returns_every_item_once(stub):
+    server, handler = stub
+
+    items = run(
+        server,
+        TokenBucket(rate=100, max_rate=100),
+        lambda client: client.current_user_saved_tracks(),
+    )
+
+    offsets = sorted(int(query["offset"]) for _, query in handler.requests)
+    assert offsets == [0, 50, 100]
+    ids = [item["id"] for item in items]
+    assert len(ids) == len(set(ids))
@@ -0,0 +1,127 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from changes import HashIndex, diff, load_changes, row_hashes
+from schemas import SCHEMAS
+from sinks import get_sink
+
+KEYS = ["album_id"]
+
+
+def albums(*rows: tuple[str, str]) -> pd.DataFrame:
+    """
+    Builds a my_albums table from (album_id, album_name) pairs.
+    """
+    data = pd.DataFrame(
+        {column.name: [None] * len(rows) for column in SCHEMAS["my_albums"]}
+    )
+    data["album_id"] = [row[0] for row in rows]
+    data["album_name"] = [row[1] for row in rows]
+    data["album_type"] = "album"
+    data["album_popularity"] = 50
+    return data
+
+
+@pytest.fixture
+def sqlite_sink(tmp_path, monkeypatch):
+    monkeypatch.setenv("SINK", "sqlite")
+    monkeypatch.setenv("SINK_PATH", str(tmp_path / "spotify.sqlite"))
+    monkeypatch.setenv("STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setenv("CHANGE_CAPTURE", "true")
+    get_sink.cache_clear()
+    yield get_sink()
+    get_sink.cache_clear()
+
+
+def read_albums(sink) -> dict[str, str]:
+    with sqlite3.connect(sink.path) as connection:
+        rows = connection.execute("SELECT album_id, album_name FROM my_albums")
+        return dict(rows.fetchall())
+
+
+def test_diff_finds_inserts_updates_and_deletes():
+    previous = row_hashes(albums(("a", "A"), ("b", "B"), ("c", "C")), "my_albums", KEYS)
+    current = row_hashes(albums(("a", "A"), ("b", "B2"), ("d", "D")), "my_albums", KEYS)
+
+    inserted, updated, deleted = diff(current, previous, KEYS)
+
+    assert inserted.tolist() == [False, False, True]
+    assert updated.tolist() == [False, True, False]
+    assert deleted["album_id"].tolist() == ["c"]
+
+
+def test_diff_of_unchanged_table_is_empty():
+    hashes = row_hashes(albums(("a", "A"), ("b", "B")), "my_albums", KEYS)
+
+    inserted, updated, deleted = diff(hashes, hashes, KEYS)
+
+    assert not inserted.any()
+    assert not updated.any()
+    assert deleted.empty
+
+
+def test_category_and_string_columns_hash_alike():
+    data = albums(("a", "A"), ("b", "B"))
+    categories = data.astype({"album_type": "category", "album_name": "category"})
+
+    assert (
+        row_hashes(data, "my_albums", KEYS)["row_hash"].tolist()
+        == row_hashes(categories, "my_albums", KEYS)["row_hash"].tolist()
+    )
+
+
+def test_load_changes_merges_only_changed_rows(sqlite_sink, monkeypatch):
+    load_changes(albums(("a", "A"), ("b", "B"), ("c", "C")), "my_albums", KEYS)
+    assert read_albums(sqlite_sink) == {"a": "A", "b": "B", "c": "C"}
+
+    merges = []
+    merge = sqlite_sink.merge
+
+    def record(data, *args):
+        merges.append(data["album_id"].tolist())
+        merge(data, *args)
+
+    monkeypatch.setattr(sqlite_sink, "merge", record)
+    load_changes(albums(("a", "A"), ("b", "B2"), ("d", "D")), "my_albums", KEYS)
+
+    assert merges == [["b", "d"]]
+    assert read_albums(sqlite_sink) == {"a": "A", "b": "B2", "d": "D"}
+
+
+def test_load_changes_skips_unchanged_table(sqlite_sink, monkeypatch):
+    load_changes(albums(("a", "A")), "my_albums", KEYS)
+    monkeypatch.setattr(
+        sqlite_sink, "merge", lambda *args: pytest.fail("Nothing changed")
+    )
+
+    load_changes(albums(("a", "A")), "my_albums", KEYS)
+
+    assert read_albums(sqlite_sink) == {"a": "A"}
+
+
+def test_hash_index_is_kept_per_destination(sqlite_sink, tmp_path, monkeypatch):
+    path = HashIndex("my_albums").path
+
+    monkeypatch.setenv("SINK_PATH", str(tmp_path / "other.sqlite"))
+    get_sink.cache_clear()
+
+    assert HashIndex("my_albums").path != path
+
+
+def test_load_without_change_capture_drops_the_row_hashes(sqlite_sink, monkeypatch):
+    load_changes(albums(("a", "A"), ("b", "B")), "my_albums", KEYS)
+
+    monkeypatch.setenv("CHANGE_CAPTURE", "false")
+    load_changes(albums(("a", "A"), ("c", "C")), "my_albums", KEYS)
+    assert not os.path.exists(HashIndex("my_albums").path)
+
+    monkeypatch.setenv("CHANGE_CAPTURE", "true")
+    monkeypatch.setattr(
+        sqlite_sink, "merge", lambda *args: pytest.fail("Expected a full load")
+    )
+    load_changes(albums(("a", "A"), ("b", "B")), "my_albums", KEYS)
+
+    assert read_albums(sqlite_sink) == {"a": "A", "b": "B"}
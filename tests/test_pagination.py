@@ -0,0 +1,54 @@
+import pytest
+
+from pagination import fetch_all_pages, iter_pages
+
+
+class FakeEndpoint:
+    """
+    An offset-based paging endpoint over the items 0 to total - 1.
+    """
+
+    def __init__(self, total: int, first_page_size: int | None = None):
+        self.total = total
+        self.first_page_size = first_page_size
+        self.offsets = []
+
+    def __call__(self, limit: int, offset: int) -> dict:
+        self.offsets.append(offset)
+        size = limit if offset or self.first_page_size is None else self.first_page_size
+        items = list(range(offset, min(offset + size, self.total)))
+        return {
+            "items": items,
+            "limit": limit,
+            "offset": offset,
+            "total": self.total,
+            "next": "next" if offset + limit < self.total else None,
+        }
+
+
+@pytest.mark.parametrize("total", [0, 1, 49, 50, 51, 120])
+def test_fetch_all_pages_returns_every_item_once(total):
+    endpoint = FakeEndpoint(total)
+
+    items = fetch_all_pages(endpoint, limit=50)
+
+    assert items == list(range(total))
+    assert sorted(endpoint.offsets) == list(range(0, max(total, 1), 50))
+
+
+def test_short_first_page_does_not_shift_the_offsets():
+    endpoint = FakeEndpoint(120, first_page_size=30)
+
+    items = fetch_all_pages(endpoint, limit=50)
+
+    assert sorted(endpoint.offsets) == [0, 50, 100]
+    assert len(items) == len(set(items))
+
+
+def test_iter_pages_stops_at_the_last_page():
+    endpoint = FakeEndpoint(120)
+
+    pages = list(iter_pages(endpoint, limit=50))
+
+    assert [item for page in pages for item in page] == list(range(120))
+    assert endpoint.offsets == [0, 50, 100]
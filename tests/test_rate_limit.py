@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import spotipy
+
+from rate_limit import RateLimitedSpotify, TokenBucket
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Statuses and headers of the responses sent before the first 200
+    failures: list[tuple[int, dict]] = []
+    requests: list[float] = []
+
+    def do_GET(self):
+        self.requests.append(time.monotonic())
+        status, headers = self.failures.pop(0) if self.failures else (200, {})
+        body = json.dumps(
+            {"id": "stub-user"} if status == 200 else {"error": {"status": status}}
+        ).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubHandler.requests = []
+    yield server, StubHandler
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server, limiter: TokenBucket) -> RateLimitedSpotify:
+    sp = RateLimitedSpotify(auth="stub-token", limiter=limiter, backoff_factor=0.01)
+    sp.prefix = f"http://127.0.0.1:{server.server_port}/v1/"
+    return sp
+
+
+def test_retry_after_is_honoured(stub):
+    server, handler = stub
+    handler.failures = [(429, {"Retry-After": "2"})]
+    limiter = TokenBucket(rate=100, max_rate=100)
+
+    assert make_client(server, limiter).me() == {"id": "stub-user"}
+
+    first, second = handler.requests
+    assert second - first >= 1.9
+    assert limiter.throttled == 1
+
+
+def test_server_errors_keep_their_status(stub):
+    server, handler = stub
+    handler.failures = [(500, {}), (502, {})]
+    limiter = TokenBucket(rate=100, max_rate=100)
+
+    assert make_client(server, limiter).me() == {"id": "stub-user"}
+
+    assert len(handler.requests) == 3
+    # Server errors are retried without slowing down the other callers
+    assert limiter.throttled == 0
+
+
+def test_client_errors_are_not_retried(stub):
+    server, handler = stub
+    handler.failures = [(404, {})]
+
+    with pytest.raises(spotipy.SpotifyException) as error:
+        make_client(server, TokenBucket(rate=100, max_rate=100)).me()
+
+    assert error.value.http_status == 404
+    assert len(handler.requests) == 1
@@ -0,0 +1,52 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sinks import get_sink
+from state import get_state_dir, load_state, save_watermark
+
+TABLES = ["saved_tracks", "saved_episodes", "saved_shows", "album_tracks"]
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("SINK", "sqlite")
+    monkeypatch.setenv("SINK_PATH", str(tmp_path / "spotify.sqlite"))
+    monkeypatch.setenv("STATE_DIR", str(tmp_path / "state"))
+    get_sink.cache_clear()
+    yield tmp_path / "state"
+    get_sink.cache_clear()
+
+
+def test_concurrent_watermarks_are_all_saved(state_dir):
+    def save(table_id: str):
+        for i in range(50):
+            save_watermark(table_id, f"2024-01-01T00:00:{i:02d}Z", full_sync=True)
+
+    with ThreadPoolExecutor(max_workers=len(TABLES)) as executor:
+        list(executor.map(save, TABLES))
+
+    watermarks = load_state("watermarks")
+    assert sorted(watermarks) == sorted(TABLES)
+    assert {watermark["added_at"] for watermark in watermarks.values()} == {
+        "2024-01-01T00:00:49Z"
+    }
+    assert not [name for name in os.listdir(get_state_dir()) if name.endswith(".tmp")]
+
+
+def test_state_is_kept_per_destination_and_layout(state_dir, tmp_path, monkeypatch):
+    save_watermark("saved_tracks", "2024-01-01T00:00:00Z", full_sync=True)
+    state_dirs = {get_state_dir()}
+
+    monkeypatch.setenv("NORMALISED_TABLES", "true")
+    assert load_state("watermarks") == {}
+    state_dirs.add(get_state_dir())
+
+    monkeypatch.setenv("SINK_PATH", str(tmp_path / "other.sqlite"))
+    get_sink.cache_clear()
+    assert load_state("watermarks") == {}
+    state_dirs.add(get_state_dir())
+
+    assert len(state_dirs) == 3
+    assert all(path.startswith(str(state_dir)) for path in state_dirs)
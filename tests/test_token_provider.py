@@ -0,0 +1,39 @@
+import json
+import time
+
+from token_provider import TokenProvider
+
+SCOPE = "user-library-read user-top-read"
+
+
+def provider(tmp_path, refresh_token: str | None) -> TokenProvider:
+    return TokenProvider(
+        client_id="client",
+        client_secret="secret",
+        redirect_uri="http://127.0.0.1:8888/callback",
+        scope=SCOPE,
+        cache_path=str(tmp_path / "token.json"),
+        refresh_token=refresh_token,
+    )
+
+
+def test_token_missing_scopes_is_refreshed_from_the_refresh_token(tmp_path):
+    cached = {
+        "access_token": "cached",
+        "refresh_token": "cached-refresh",
+        "scope": "user-library-read",
+        "expires_at": time.time() + 3600,
+    }
+    (tmp_path / "token.json").write_text(json.dumps(cached))
+    token_provider = provider(tmp_path, refresh_token="env-refresh")
+    refreshed = []
+
+    def refresh_access_token(refresh_token: str) -> dict:
+        refreshed.append(refresh_token)
+        return {**cached, "access_token": "refreshed", "scope": SCOPE}
+
+    token_provider._oauth.refresh_access_token = refresh_access_token
+
+    assert token_provider._refresh()["access_token"] == "refreshed"
+    assert refreshed == ["env-refresh"]
+    assert json.loads((tmp_path / "token.json").read_text())["scope"] == SCOPE
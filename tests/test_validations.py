@@ -0,0 +1,29 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from validations import check_if_valid_interval
+
+NOW = datetime(2024, 1, 3, 12, 0, tzinfo=timezone.utc)
+
+
+def test_timestamps_inside_the_interval_are_valid():
+    timestamps = ["2024-01-03T11:59:00.000Z", "2024-01-02T13:00:00.000Z"]
+
+    assert check_if_valid_interval(timestamps, NOW, 24)
+
+
+def test_gaps_over_a_day_are_not_valid():
+    # timedelta.seconds of a 25 hour gap is one hour, this must not pass as one
+    timestamps = ["2024-01-03T11:00:00Z", "2024-01-02T11:00:00Z"]
+
+    with pytest.raises(ValueError, match="not within the valid interval"):
+        check_if_valid_interval(timestamps, NOW, 24)
+
+
+def test_intervals_longer_than_a_day():
+    timestamps = ["2024-01-01T12:30:00Z"]
+
+    assert check_if_valid_interval(timestamps, NOW, 48)
+    with pytest.raises(ValueError):
+        check_if_valid_interval(timestamps, NOW, 47)